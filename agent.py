@@ -1,20 +1,26 @@
 import os
 import re
+import random
+import hashlib
+import logging
 from bibliography import Bibliography
 import discord
 from mistralai import Mistral
 import asyncio
-import json
 from mistralai.models.sdkerror import SDKError
 from citation_formatter import get_available_styles
 from research_notes import ResearchNotes
 from reading_lists import ReadingLists
+from caching import LRUCache
 
 
-from query_processing import is_research_query, extract_search_query
+from query_processing import classify_and_extract, extract_search_query, quick_triage
 from scholar_search import search_google_scholar, format_search_results
 
+logger = logging.getLogger(__name__)
+
 MISTRAL_MODEL = "mistral-large-latest"
+RATE_LIMIT_MESSAGE = "Rate limit exceeded. Please try again later."
 SYSTEM_PROMPT = """
 You are a helpful research assistant chatbot. 
 Your primary role is to help users find academic research papers, summarize key information, and provide relevant context.
@@ -29,6 +35,92 @@ Keep your answers concise and focused on the most important information.
 Do not fabricate paper titles, authors, or citations. Only provide information that is included in the search results.
 """
 
+# System messages that never change are built once and shared by every request
+_CHAT_SYSTEM_MESSAGE = {"role": "system", "content": "You are a helpful assistant."}
+_RESEARCH_NO_QUERY_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a research assistant. The user has a research query.",
+}
+_RESEARCH_SYSTEM_PREFIX = "You are a research assistant. Answer based on these papers:\n\n"
+
+# Natural-language commands as (branch name, command, pattern) rows. All rows are
+# joined into one alternation so a message is scanned once; the name of the matched
+# branch selects the handler, and the row's own pattern extracts the arguments.
+# The text of an added note is everything after the match, taken with plain slicing.
+_COMMAND_TABLE = (
+    ("note_add", "add", r'\b(?:add|create)\s+(?:a\s+)?note\s+(?:to|for)\s+paper\s+(?P<paper_index>\d+)'),
+    ("note_view", "view", r'\b(?:view|show|get|display)\s+(?:the\s+)?notes\s+(?:for|on)\s+paper\s+(?P<paper_index>\d+)'),
+    ("note_view_all", "view_all", r'\b(?:view|show|get|display)\s+(?:all\s+)?(?:my\s+)?(?:research\s+)?notes'),
+    ("note_delete", "delete", r'\b(?:delete|remove)\s+note\s+(?P<note_index>\d+)\s+(?:from|for)\s+paper\s+(?P<paper_index>\d+)'),
+    ("note_clear", "clear", r'\b(?:clear|delete\s+all)\s+notes\s+(?:for|from)\s+paper\s+(?P<paper_index>\d+)'),
+    ("note_clear_all", "clear_all", r'\b(?:clear|delete)\s+all\s+(?:my\s+)?(?:research\s+)?notes'),
+    ("rl_create", "create", r'\b(?:create|make|new)\s+(?:a\s+)?reading\s+list\s+(?:called|named)?\s+(?P<list_name>[\w_-]+)'),
+    ("rl_add", "add", r'\b(?:add)\s+paper\s+(?P<paper_index>\d+)\s+(?:to|into)\s+(?:my\s+)?reading\s+list\s+(?P<list_name>[\w_-]+)'),
+    ("rl_view", "view", r'\b(?:view|show|display|list)\s+(?:my\s+)?reading\s+list\s+(?P<list_name>[\w_-]+)'),
+    ("rl_view_all", "view_all", r'\b(?:view|show|display|list)\s+(?:all\s+)?(?:my\s+)?reading\s+lists'),
+    ("rl_remove", "remove", r'\b(?:remove|delete)\s+paper\s+(?P<paper_index>\d+)\s+from\s+(?:my\s+)?reading\s+list\s+(?P<list_name>[\w_-]+)'),
+    ("rl_delete", "delete", r'\b(?:delete|remove)\s+(?:my\s+)?reading\s+list\s+(?P<list_name>[\w_-]+)'),
+    ("related", "related", r'\b(?:find|show|get|display)\s+(?:papers|research)\s+(?:related|similar)\s+(?:to)?\s+(?:paper\s+)?(?P<paper_index>\d+)\b'),
+    ("cite", "cite", r'\b(?:cite|format|citation)\s+(?:paper)?\s*(?P<paper_index>\d+)?\s+(?:in|as|using)?\s+(?P<style>[a-zA-Z]+)(?:\s+format|style)?\b'),
+    ("bibliography", "bibliography", r'\b(?:give|show|display|present|list)\s+(?:me\s+)?(?:the\s+)?(?:bibliography|citations|references)(?:\s+in\s+(?P<style>[a-zA-Z]+)(?:\s+format|style)?)?'),
+    ("papers", "papers", r'\b(?:list|show|give|display)\s+(?:me\s+)?(?:the\s+)?(?:cited\s+)?papers\b'),
+    ("styles", "styles", r'\b(?:what|which|list|show)\s+(?:are\s+)?(?:the\s+)?(?:available\s+)?citation\s+(?:styles|formats)\b'),
+)
+_COMMAND_PATTERNS = {
+    branch: (command, re.compile(pattern, re.IGNORECASE))
+    for branch, command, pattern in _COMMAND_TABLE
+}
+# Argument group names repeat across rows, so they become non-capturing in the alternation
+_NAMED_GROUP_RE = re.compile(r'\(\?P<\w+>')
+_DISPATCH_RE = re.compile(
+    "|".join(f"(?P<{branch}>{_NAMED_GROUP_RE.sub('(?:', pattern)})" for branch, _, pattern in _COMMAND_TABLE),
+    re.IGNORECASE,
+)
+
+# The explicit !reading_list form is tokenized with str.split rather than a regex
+_READING_LIST_PREFIX = "!reading_list"
+_READING_LIST_PREFIX_COMMANDS = frozenset({"create", "add", "view", "remove", "delete"})
+# A list name is the leading run of word characters and dashes in its token, and a paper
+# index the leading digits of the next token, exactly as the original prefix regex read them
+_LIST_NAME_RE = re.compile(r'[\w_-]+')
+_LEADING_DIGITS_RE = re.compile(r'\d+')
+
+# Every natural-language command contains at least one of these keywords, so messages
+# without any of them can skip the regex checks and go straight to the LLM
+_COMMAND_HINTS = ('note', 'paper', 'cite', 'citation', 'format', 'bibliograph', 'reference', 'reading', 'related', 'similar')
+
+# The set of citation styles is fixed, so the reply listing them is built once
+_STYLES_LINE = f"Available citation styles: {', '.join(style.upper() for style in get_available_styles())}"
+
+def _normalize(text):
+    """Lowercase text and collapse runs of whitespace, so trivially different messages share cache entries"""
+    return " ".join(text.lower().split())
+
+# Rate limiting and transient server errors are worth retrying; anything else is raised
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_MAX_RETRY_AFTER = 60
+
+def _retry_after(error):
+    """
+    Read the Retry-After delay from a Mistral SDK error, if the server sent one
+    
+    Parameters:
+    error (SDKError): The error raised by the Mistral client
+    
+    Returns:
+    float or None: Seconds to wait, capped at _MAX_RETRY_AFTER, or None if absent
+    """
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "raw_response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return min(float(headers.get("retry-after")), _MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        # Missing, or an HTTP date rather than a number of seconds
+        return None
+
 class MistralAgent:
     def __init__(self):
         MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
@@ -36,234 +128,381 @@ class MistralAgent:
         self.bibliography = Bibliography()
         self.notes = ResearchNotes()
         self.reading_lists = ReadingLists()
+        # Maps a hash of the normalized message to (is_research, search_query); entries
+        # expire after an hour so a bad classification doesn't stick around forever
+        self._classify_cache = LRUCache(maxsize=512, ttl=3600)
+        # Classifications currently being computed, so identical concurrent messages share one
+        self._classify_inflight = {}
+        # Maps (digest of the system message, normalized message) to the chunks of a previous
+        # answer; the system message carries the search results, so new results mean a new key
+        self._answer_cache = LRUCache(maxsize=256, ttl=3600)
+        # Caps concurrent Mistral requests across all channels
+        self._llm_slots = asyncio.Semaphore(int(os.getenv("MISTRAL_CONCURRENCY", "4")))
+        # Maps each command branch name to its handler; all handlers take (message, command_info)
+        self._command_handlers = {
+            "note_add": self._note_add,
+            "note_view": self._note_view,
+            "note_view_all": self._note_view_all,
+            "note_delete": self._note_delete,
+            "note_clear": self._note_clear,
+            "note_clear_all": self._note_clear_all,
+            "rl_create": self._reading_list_create,
+            "rl_add": self._reading_list_add,
+            "rl_view": self._reading_list_view,
+            "rl_view_all": self._reading_list_view_all,
+            "rl_remove": self._reading_list_remove,
+            "rl_delete": self._reading_list_delete,
+            "related": self.handle_related_command,
+            "cite": self.handle_citation_command,
+            "bibliography": self.handle_bibliography_command,
+            "papers": self.handle_papers_command,
+            "styles": self.handle_styles_command,
+        }
 
     async def run(self, message: discord.Message):
-        # Handle note commands
-        note_command = self.check_for_note_command(message.content)
-        if note_command:
-            return await self.handle_note_command(message, note_command)
-        
-        # Handle reading list commands
-        reading_list_command = self.check_for_reading_list_command(message.content)
-        if reading_list_command:
-            return await self.handle_reading_list_command(message, reading_list_command)
-        
-        # Handle related papers commands
-        related_papers_match = re.search(r'\b(?:find|show|get|display)\s+(?:papers|research)\s+(?:related|similar)\s+(?:to)?\s+(?:paper\s+)?(\d+)\b', message.content.lower())
-        if related_papers_match:
-            paper_index = related_papers_match.group(1)
-            return self.split_message(self.bibliography.find_related_papers(int(paper_index)))
-        
-        # Handle citation formatting commands
-        if re.search(r'\b(cite|format|citation)\s+(?:paper)?\s*(\d+)?\s+(?:in|as|using)?\s+([a-zA-Z]+)(?:\s+format|style)?\b', message.content.lower()):
-            return await self.handle_citation_command(message)
-        
-        # Handle bibliography requests
-        if re.search(r'\b(give|show|display|present|list)\s+(?:me\s+)?(?:the\s+)?(bibliography|citations|references)(?:\s+in\s+([a-zA-Z]+)(?:\s+format|style)?)?', message.content.lower()):
-            return self.handle_bibliography_command(message)
-        
-        # Handle paper list requests
-        if re.search(r'\b(list|show|give|display)\s+(?:me\s+)?(?:the\s+)?(?:cited\s+)?papers\b', message.content.lower()):
-            return self.split_message(self.bibliography.get_paper_list())
-        
-        # Handle citation styles listing
-        if re.search(r'\b(what|which|list|show)\s+(?:are\s+)?(?:the\s+)?(?:available\s+)?citation\s+(?:styles|formats)\b', message.content.lower()):
-            styles = get_available_styles()
-            return [f"Available citation styles: {', '.join(style.upper() for style in styles)}"]
+        return [chunk async for chunk in self.stream(message)]
+
+    async def stream(self, message: discord.Message):
+        """
+        Produce the reply to a message, yielding each Discord-sized chunk as soon as it
+        is ready so the first part can be sent while the model is still generating
+        
+        Parameters:
+        message (discord.Message): The message to reply to
+        
+        Yields:
+        str: Message chunks of at most 2000 characters
+        """
+        # Handle natural-language commands
+        content_lower = message.content.lower()
+        if any(hint in content_lower for hint in _COMMAND_HINTS):
+            command_response = await self.handle_command(message)
+            if command_response is not None:
+                for chunk in command_response:
+                    yield chunk
+                return
 
         # Original message processing
-        is_research = await is_research_query(self.client, message.content)
+        is_research, search_query = await self.classify_message(message.content)
+        # An answer written without any papers is not worth repeating: the search may
+        # succeed next time, just as empty results are kept out of the search cache
+        cacheable = True
 
         if is_research:
-            search_query = await extract_search_query(self.client, message.content)
             if search_query:
                 await message.channel.send(f"Searching for: '{search_query}'...")
                 search_results = await search_google_scholar(search_query)
                 formatted_results = await format_search_results(search_query, search_results)
-                system_content = f"You are a research assistant. Answer based on these papers:\n\n{formatted_results}"
+                system_message = {
+                    "role": "system",
+                    "content": _RESEARCH_SYSTEM_PREFIX + formatted_results,
+                }
 
                 # Add papers to bibliography
-                for paper in search_results:
-                    self.bibliography.add_paper(paper)
+                self.bibliography.add_papers(search_results)
+                cacheable = bool(search_results)
             else:
-                system_content = "You are a research assistant. The user has a research query."
+                system_message = _RESEARCH_NO_QUERY_SYSTEM_MESSAGE
         else:
-            system_content = "You are a helpful assistant."
+            system_message = _CHAT_SYSTEM_MESSAGE
+
+        # Answers depend on the question and on the system message, which holds the search results
+        answer_key = (
+            hashlib.blake2b(system_message["content"].encode(), digest_size=16).digest(),
+            _normalize(message.content),
+        )
+        cached_answer = self._answer_cache.get(answer_key)
+        if cached_answer is not None:
+            for chunk in cached_answer:
+                yield chunk
+            return
 
         messages = [
-            {"role": "system", "content": system_content},
+            system_message,
             {"role": "user", "content": message.content},
         ]
 
-        retries = 5  # Max retries
-        delay = 2  # Initial delay in seconds
-
-        for attempt in range(retries):
-            try:
-                response = await self.client.chat.complete_async(
-                    model=MISTRAL_MODEL,
-                    messages=messages
-                )
-                content = response.choices[0].message.content
-                return self.split_message(content)
-
-            except SDKError as e:
-                error_data = json.loads(str(e).replace("SDKError: ", "").strip())
-                if "Requests rate limit exceeded" in error_data.get("message", ""):
+        chunks = []
+        async for chunk in self.stream_response(messages):
+            chunks.append(chunk)
+            yield chunk
+        # An empty completion would otherwise be replayed as an empty reply for the whole TTL
+        if cacheable and chunks and chunks != [RATE_LIMIT_MESSAGE]:
+            self._answer_cache.put(answer_key, chunks)
+
+    async def stream_response(self, messages):
+        """
+        Stream a chat completion from Mistral, yielding Discord-sized chunks as soon
+        as enough text has been generated instead of waiting for the full response
+        
+        Parameters:
+        messages (list): Chat messages to send to the model
+        
+        Yields:
+        str: Message chunks of at most 2000 characters
+        """
+        # Each stream holds one of the shared request slots for its whole lifetime,
+        # including backoff, so a busy server cannot flood Mistral with retries
+        async with self._llm_slots:
+            retries = 5  # Max retries
+
+            for attempt in range(retries):
+                try:
+                    stream = await self.client.chat.stream_async(
+                        model=MISTRAL_MODEL,
+                        messages=messages
+                    )
+                    break
+
+                except SDKError as e:
+                    # Check the status code instead of parsing the error body, which is not always JSON
+                    status_code = getattr(e, "status_code", None)
+                    if status_code not in _RETRYABLE_STATUS_CODES:
+                        raise e  # Re-raise other errors
+                    
                     if attempt < retries - 1:
-                        print(f"Rate limit exceeded. Retrying in {delay} seconds...")
+                        # Honor the server's Retry-After when given; otherwise use capped exponential
+                        # backoff with jitter, so channels that fail together don't all retry at once
+                        delay = _retry_after(e)
+                        if delay is None:
+                            delay = min(32, 2 ** (attempt + 1)) * (0.5 + random.random())
+                        logger.warning(f"Mistral returned {status_code}. Retrying in {delay:.1f} seconds...")
                         await asyncio.sleep(delay)
-                        delay *= 2  # Exponential backoff
+                    elif status_code == 429:
+                        logger.warning("Max retries reached. Unable to process request.")
+                        yield RATE_LIMIT_MESSAGE
+                        return
                     else:
-                        print("Max retries reached. Unable to process request.")
-                        return ["Rate limit exceeded. Please try again later."]
-                else:
-                    raise e  # Re-raise other errors
+                        raise e
+
+            # Split incrementally the same way split_message splits the full text. A chunk is only
+            # final once more than 2000 characters follow its start, and the whitespace skipped
+            # after a split may continue into later deltas, so that skip is carried over
+            buffer = []
+            buffer_length = 0
+            skip_space = False
+            async for event in stream:
+                delta = event.data.choices[0].delta.content
+                if not isinstance(delta, str) or not delta:
+                    continue
+                
+                buffer.append(delta)
+                buffer_length += len(delta)
+                if buffer_length <= 2000:
+                    continue
+                
+                text = "".join(buffer)
+                start = 0
+                end = len(text)
+                if skip_space:
+                    while start < end and text[start].isspace():
+                        start += 1
+                    skip_space = start == end
+                while end - start > 2000:
+                    split_index = text.rfind('\n', start, start + 2000)
+                    if split_index <= start:  # If no newline found, force split at 2000
+                        split_index = start + 2000
+                    
+                    yield text[start:split_index]
+                    start = split_index
+                    while start < end and text[start].isspace():
+                        start += 1
+                    skip_space = start == end
+                buffer = [text[start:]] if start < end else []
+                buffer_length = end - start
+            
+            text = "".join(buffer)
+            if skip_space:
+                text = text.lstrip()
+            if text:
+                yield text
+
+    async def _limited(self, func, *args):
+        """Await func(*args) while holding one of the shared Mistral request slots"""
+        async with self._llm_slots:
+            return await func(*args)
+
+    async def classify_message(self, content):
+        """
+        Decide whether a message is a research query and extract its search query,
+        reusing the result for messages that have been classified before
+        
+        Parameters:
+        content (str): The message content
+        
+        Returns:
+        tuple: (is_research, search_query); search_query is None if not a research query
+        """
+        normalized = _normalize(content)
+        is_research = quick_triage(normalized)
+        if is_research is False:
+            return (False, None)
+        
+        cache_key = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        classification = self._classify_cache.get(cache_key)
+        if classification is not None:
+            return classification
+        
+        pending = self._classify_inflight.get(cache_key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._classify_uncached(content, is_research, cache_key))
+            self._classify_inflight[cache_key] = pending
+            pending.add_done_callback(lambda _: self._classify_inflight.pop(cache_key, None))
+        # Shielded so a cancelled caller doesn't cancel the work other callers are waiting on
+        return await asyncio.shield(pending)
     
-    def check_for_note_command(self, message_content):
-        """Check if the message contains a note command and return the type of command"""
-        
-        # Check for add note command
-        add_match = re.search(r'\b(?:add|create)\s+(?:a\s+)?note\s+(?:to|for)\s+paper\s+(\d+)\s*(?::|-)?\s*(.*)', message_content, re.IGNORECASE | re.DOTALL)
-        if add_match:
-            return {
-                "command": "add",
-                "paper_index": add_match.group(1),
-                "note_text": add_match.group(2).strip()
-            }
+    async def _classify_uncached(self, content, is_research, cache_key):
+        """Ask Mistral to classify a message (is_research is the local triage result) and cache the answer"""
+        if is_research:
+            search_query = await self._limited(extract_search_query, self.client, content)
+            failed = search_query is None
+        else:
+            # Classify and extract in one request; the query is only used for research queries
+            result = await self._limited(classify_and_extract, self.client, content)
+            failed = result is None
+            is_research, search_query = result if not failed else (False, None)
+            if not is_research:
+                search_query = None
+        
+        classification = (is_research, search_query)
+        # A failed request says nothing about the message, so only real answers are cached
+        # and the next identical message asks Mistral again
+        if not failed:
+            self._classify_cache.put(cache_key, classification)
+        return classification
+
+    async def handle_command(self, message):
+        """Run the natural-language command matching the message, or return None if there is none"""
+        parsed = self.parse_command(message.content)
+        if parsed is None:
+            return None
+        
+        branch, command_info = parsed
+        return await self._command_handlers[branch](message, command_info)
+    
+    def parse_command(self, message_content):
+        """
+        Find the command in a message with a single scan of the dispatch pattern
         
-        # Check for view notes command for a specific paper
-        view_paper_match = re.search(r'\b(?:view|show|get|display)\s+(?:the\s+)?notes\s+(?:for|on)\s+paper\s+(\d+)', message_content, re.IGNORECASE)
-        if view_paper_match:
-            return {
-                "command": "view",
-                "paper_index": view_paper_match.group(1)
-            }
+        Parameters:
+        message_content (str): The message text
         
-        # Check for view all notes command
-        view_all_match = re.search(r'\b(?:view|show|get|display)\s+(?:all\s+)?(?:my\s+)?(?:research\s+)?notes', message_content, re.IGNORECASE)
-        if view_all_match:
-            return {
-                "command": "view_all"
-            }
+        Returns:
+        tuple or None: (branch name, command info dict), or None if there is no command
+        """
+        match = _DISPATCH_RE.search(message_content)
+        if not match:
+            command_info = self.check_for_reading_list_command(message_content)
+            if command_info is None:
+                return None
+            return f"rl_{command_info['command']}", command_info
+        
+        branch = match.lastgroup
+        command, pattern = _COMMAND_PATTERNS[branch]
+        # Re-run only the matched row, anchored where the alternation matched, for its arguments
+        args = pattern.match(message_content, match.start())
+        command_info = {"command": command, **args.groupdict()}
+        
+        if branch == "note_add":
+            note_text = message_content[args.end():].lstrip()
+            if note_text[:1] in (":", "-"):
+                note_text = note_text[1:]
+            command_info["note_text"] = note_text.strip()
+        
+        return branch, command_info
+
+    async def _note_add(self, message, command_info):
+        """Add note to a paper"""
+        conversation_id = message.channel.id
         
-        # Check for delete note command
-        delete_match = re.search(r'\b(?:delete|remove)\s+note\s+(\d+)\s+(?:from|for)\s+paper\s+(\d+)', message_content, re.IGNORECASE)
-        if delete_match:
-            return {
-                "command": "delete",
-                "note_index": delete_match.group(1),
-                "paper_index": delete_match.group(2)
-            }
+        paper_index = command_info["paper_index"]
+        note_text = command_info["note_text"]
         
-        # Check for clear notes command
-        clear_match = re.search(r'\b(?:clear|delete\s+all)\s+notes\s+(?:for|from)\s+paper\s+(\d+)', message_content, re.IGNORECASE)
-        if clear_match:
-            return {
-                "command": "clear",
-                "paper_index": clear_match.group(1)
-            }
+        if not note_text:
+            return ["Please provide the note text. Example: 'add note to paper 1: This paper has interesting methodology.'"]
         
-        # Check for clear all notes command
-        clear_all_match = re.search(r'\b(?:clear|delete)\s+all\s+(?:my\s+)?(?:research\s+)?notes', message_content, re.IGNORECASE)
-        if clear_all_match:
-            return {
-                "command": "clear_all"
-            }
+        paper_key, paper, paper_title = self.bibliography.get_paper_entry(paper_index)
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
         
-        return None
+        success = self.notes.add_note(conversation_id, paper_key, note_text)
+        if success:
+            return [f"✓ Note added to paper: {paper_title}"]
+        else:
+            return ["⚠ Failed to add note. Please try again."]
 
-    async def handle_note_command(self, message, command_info):
-        """Handle note commands"""
-        conversation_id = str(message.channel.id)
+    async def _note_view(self, message, command_info):
+        """View notes for a specific paper"""
+        conversation_id = message.channel.id
         
-        # Add note to a paper
-        if command_info["command"] == "add":
-            paper_index = command_info["paper_index"]
-            note_text = command_info["note_text"]
-            
-            if not note_text:
-                return ["Please provide the note text. Example: 'add note to paper 1: This paper has interesting methodology.'"]
-            
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            success = self.notes.add_note(conversation_id, paper_key, note_text)
-            if success:
-                paper_title = self.bibliography.get_paper_title(paper_key)
-                return [f"✓ Note added to paper: {paper_title}"]
-            else:
-                return ["⚠ Failed to add note. Please try again."]
+        paper_index = command_info["paper_index"]
+        paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
         
-        # View notes for a specific paper
-        elif command_info["command"] == "view":
-            paper_index = command_info["paper_index"]
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            paper_info = self.bibliography.get_paper_info_dict()
-            formatted_notes = self.notes.format_notes(conversation_id, paper_key, paper_info)
-            return self.split_message(formatted_notes)
-        
-        # View all notes
-        elif command_info["command"] == "view_all":
-            paper_info = self.bibliography.get_paper_info_dict()
-            formatted_notes = self.notes.format_notes(conversation_id, paper_info=paper_info)
-            return self.split_message(formatted_notes)
-        
-        # Delete a specific note
-        elif command_info["command"] == "delete":
-            note_index = int(command_info["note_index"]) - 1  # Convert to 0-based index
-            paper_index = command_info["paper_index"]
-            
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            success = self.notes.delete_note(conversation_id, paper_key, note_index)
-            if success:
-                paper_title = self.bibliography.get_paper_title(paper_key)
-                return [f"✓ Note {note_index + 1} deleted from paper: {paper_title}"]
-            else:
-                return [f"⚠ Note {note_index + 1} not found for paper {paper_index}."]
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
         
-        # Clear notes for a specific paper
-        elif command_info["command"] == "clear":
-            paper_index = command_info["paper_index"]
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            success = self.notes.clear_notes(conversation_id, paper_key)
-            if success:
-                paper_title = self.bibliography.get_paper_title(paper_key)
-                return [f"✓ All notes cleared for paper: {paper_title}"]
-            else:
-                return ["⚠ Failed to clear notes. Please try again."]
+        paper_titles = self.bibliography.get_display_titles()
+        formatted_notes = self.notes.format_notes(conversation_id, paper_key, paper_titles)
+        return self.split_message(formatted_notes)
+
+    async def _note_view_all(self, message, command_info):
+        """View all notes"""
+        conversation_id = message.channel.id
         
-        # Clear all notes
-        elif command_info["command"] == "clear_all":
-            success = self.notes.clear_notes(conversation_id)
-            if success:
-                return ["✓ All research notes have been cleared."]
-            else:
-                return ["⚠ Failed to clear notes. Please try again."]
+        paper_titles = self.bibliography.get_display_titles()
+        formatted_notes = self.notes.format_notes(conversation_id, paper_titles=paper_titles)
+        return self.split_message(formatted_notes)
+
+    async def _note_delete(self, message, command_info):
+        """Delete a specific note"""
+        conversation_id = message.channel.id
         
-        return ["Unknown note command. Please try again."]
+        note_index = int(command_info["note_index"]) - 1  # Convert to 0-based index
+        paper_index = command_info["paper_index"]
+        
+        paper_key, paper, paper_title = self.bibliography.get_paper_entry(paper_index)
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
+        
+        success = self.notes.delete_note(conversation_id, paper_key, note_index)
+        if success:
+            return [f"✓ Note {note_index + 1} deleted from paper: {paper_title}"]
+        else:
+            return [f"⚠ Note {note_index + 1} not found for paper {paper_index}."]
 
-    async def handle_citation_command(self, message):
-        # Extract paper index and citation style from the message
-        match = re.search(r'\b(cite|format|citation)\s+(?:paper)?\s*(\d+)?\s+(?:in|as|using)?\s+([a-zA-Z]+)(?:\s+format|style)?\b', message.content.lower())
+    async def _note_clear(self, message, command_info):
+        """Clear notes for a specific paper"""
+        conversation_id = message.channel.id
         
-        if not match:
-            return ["Please specify a paper number and citation style. Example: 'cite paper 1 in APA'"]
+        paper_index = command_info["paper_index"]
+        paper_key, paper, paper_title = self.bibliography.get_paper_entry(paper_index)
         
-        paper_index = match.group(2)
-        style = match.group(3)
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
+        
+        success = self.notes.clear_notes(conversation_id, paper_key)
+        if success:
+            return [f"✓ All notes cleared for paper: {paper_title}"]
+        else:
+            return ["⚠ Failed to clear notes. Please try again."]
+
+    async def _note_clear_all(self, message, command_info):
+        """Clear all notes"""
+        conversation_id = message.channel.id
+        
+        success = self.notes.clear_notes(conversation_id)
+        if success:
+            return ["✓ All research notes have been cleared."]
+        else:
+            return ["⚠ Failed to clear notes. Please try again."]
+
+    async def handle_related_command(self, message, command_info):
+        paper_index = int(command_info["paper_index"])
+        return self.split_message(self.bibliography.find_related_papers(paper_index))
+
+    async def handle_citation_command(self, message, command_info):
+        paper_index = command_info["paper_index"]
+        style = command_info["style"]
         
         # If paper index is not provided, return help message
         if not paper_index:
@@ -273,102 +512,41 @@ class MistralAgent:
         citation = self.bibliography.get_citation(paper_index, style)
         return [citation]
     
-    def handle_bibliography_command(self, message):
-        # Extract citation style from the message if provided
-        match = re.search(r'\b(bibliography|citations|references)(?:\s+in\s+([a-zA-Z]+)(?:\s+format|style)?)?', message.content.lower())
-        
-        style = "apa"  # Default style
-        if match and match.group(2):
-            style = match.group(2)
-        
+    async def handle_bibliography_command(self, message, command_info):
+        style = command_info["style"] or "apa"  # Default style
         return self.split_message(self.bibliography.get_formatted_bibliography(style))
 
+    async def handle_papers_command(self, message, command_info):
+        return self.split_message(self.bibliography.get_paper_list())
+
+    async def handle_styles_command(self, message, command_info):
+        return [_STYLES_LINE]
+
     def check_for_reading_list_command(self, message_content):
-        """Check if the message contains a reading list command and return the type of command"""
-        
-        # Check for create reading list command
-        create_match = re.search(r'\b(?:create|make|new)\s+(?:a\s+)?reading\s+list\s+(?:called|named)?\s+([\w_-]+)', message_content, re.IGNORECASE)
-        if create_match:
-            return {
-                "command": "create",
-                "list_name": create_match.group(1)
-            }
-        
-        # Check for add paper to reading list command
-        add_match = re.search(r'\b(?:add)\s+paper\s+(\d+)\s+(?:to|into)\s+(?:my\s+)?reading\s+list\s+([\w_-]+)', message_content, re.IGNORECASE)
-        if add_match:
-            return {
-                "command": "add",
-                "paper_index": add_match.group(1),
-                "list_name": add_match.group(2)
-            }
-        
-        # Check for view reading list(s) command
-        view_match = re.search(r'\b(?:view|show|display|list)\s+(?:my\s+)?reading\s+list\s+([\w_-]+)', message_content, re.IGNORECASE)
-        if view_match:
-            return {
-                "command": "view",
-                "list_name": view_match.group(1)
-            }
-        
-        # Check for view all reading lists command
-        view_all_match = re.search(r'\b(?:view|show|display|list)\s+(?:all\s+)?(?:my\s+)?reading\s+lists', message_content, re.IGNORECASE)
-        if view_all_match:
-            return {
-                "command": "view_all"
-            }
-        
-        # Check for remove paper from reading list command
-        remove_match = re.search(r'\b(?:remove|delete)\s+paper\s+(\d+)\s+from\s+(?:my\s+)?reading\s+list\s+([\w_-]+)', message_content, re.IGNORECASE)
-        if remove_match:
-            return {
-                "command": "remove",
-                "paper_index": remove_match.group(1),
-                "list_name": remove_match.group(2)
-            }
-        
-        # Check for delete reading list command
-        delete_match = re.search(r'\b(?:delete|remove)\s+(?:my\s+)?reading\s+list\s+([\w_-]+)', message_content, re.IGNORECASE)
-        if delete_match:
-            return {
-                "command": "delete",
-                "list_name": delete_match.group(1)
-            }
-        
-        # Check for explicit reading list commands with prefix
-        cmd_match = re.search(r'!reading_list\s+(create|add|view|remove|delete)\s+([\w_-]+)(?:\s+(\d+))?', message_content)
-        if cmd_match:
-            command = cmd_match.group(1)
-            list_name = cmd_match.group(2)
-            paper_index = cmd_match.group(3) if len(cmd_match.groups()) > 2 else None
-            
-            if command == "create":
-                return {
-                    "command": "create",
-                    "list_name": list_name
-                }
-            elif command == "add" and paper_index:
-                return {
-                    "command": "add",
-                    "list_name": list_name,
-                    "paper_index": paper_index
-                }
-            elif command == "view":
-                return {
-                    "command": "view",
-                    "list_name": list_name
-                }
-            elif command == "remove" and paper_index:
-                return {
-                    "command": "remove",
-                    "list_name": list_name,
-                    "paper_index": paper_index
-                }
-            elif command == "delete":
-                return {
-                    "command": "delete",
-                    "list_name": list_name
-                }
+        """Check if the message contains an explicit !reading_list command and return the type of command"""
+        
+        # Check for explicit reading list commands with prefix, parsed positionally:
+        # !reading_list <command> <list_name> [paper_index]
+        start = message_content.find(_READING_LIST_PREFIX)
+        while start >= 0:
+            rest = message_content[start + len(_READING_LIST_PREFIX):]
+            args = rest.split(None, 3) if rest[:1].isspace() else []
+            name_match = _LIST_NAME_RE.match(args[1]) if len(args) >= 2 else None
+            if name_match and args[0] in _READING_LIST_PREFIX_COMMANDS:
+                command, list_name = args[0], name_match.group()
+                # An index only counts if it directly follows a clean list name
+                index_match = None
+                if len(args) > 2 and name_match.end() == len(args[1]):
+                    index_match = _LEADING_DIGITS_RE.match(args[2])
+                paper_index = index_match.group() if index_match else None
+                
+                if command not in ("add", "remove"):
+                    return {"command": command, "list_name": list_name}
+                if paper_index:
+                    return {"command": command, "list_name": list_name, "paper_index": paper_index}
+                # Like re.search, stop at the first match even when it is missing its index
+                break
+            start = message_content.find(_READING_LIST_PREFIX, start + 1)
         
         # Check for view all reading lists with prefix
         if message_content.strip() == "!reading_list view" or message_content.strip() == "!reading_list":
@@ -378,99 +556,95 @@ class MistralAgent:
         
         return None
     
-    async def handle_reading_list_command(self, message, command_info):
-        """Handle reading list commands"""
-        conversation_id = str(message.channel.id)
-        
-        # Create a new reading list
-        if command_info["command"] == "create":
-            list_name = command_info["list_name"]
-            success = self.reading_lists.create_list(conversation_id, list_name)
-            
-            if success:
-                return [f"✓ Created reading list: {list_name}"]
-            else:
-                return [f"⚠ Reading list '{list_name}' already exists."]
-        
-        # Add paper to a reading list
-        elif command_info["command"] == "add":
-            list_name = command_info["list_name"]
-            paper_index = command_info["paper_index"]
-            
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            success = self.reading_lists.add_paper_to_list(conversation_id, list_name, paper_key)
-            if success:
-                paper_title = self.bibliography.get_paper_title(paper_key)
-                return [f"✓ Added paper \"{paper_title}\" to reading list: {list_name}"]
-            else:
-                return [f"⚠ Failed to add paper to reading list '{list_name}'. The list may not exist."]
-        
-        # View a specific reading list
-        elif command_info["command"] == "view":
-            list_name = command_info["list_name"]
-            paper_info = self.bibliography.get_paper_info_dict()
-            formatted_list = self.reading_lists.format_lists(conversation_id, list_name, paper_info)
-            
-            if formatted_list:
-                return self.split_message(formatted_list)
-            else:
-                return [f"⚠ Reading list '{list_name}' not found."]
-        
-        # View all reading lists
-        elif command_info["command"] == "view_all":
-            paper_info = self.bibliography.get_paper_info_dict()
-            formatted_lists = self.reading_lists.format_lists(conversation_id)
-            
-            if formatted_lists:
-                return self.split_message(formatted_lists)
-            else:
-                return ["You don't have any reading lists yet. Create one with '!reading_list create <name>'."]
+    async def _reading_list_create(self, message, command_info):
+        """Create a new reading list"""
+        list_name = command_info["list_name"]
+        success = self.reading_lists.create_list(message.channel.id, list_name)
         
-        # Remove paper from a reading list
-        elif command_info["command"] == "remove":
-            list_name = command_info["list_name"]
-            paper_index = command_info["paper_index"]
-            
-            paper_key, paper = self.bibliography.get_paper_by_index(paper_index)
-            if not paper_key:
-                return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
-            
-            success = self.reading_lists.remove_paper(conversation_id, list_name, paper_key)
-            if success:
-                paper_title = self.bibliography.get_paper_title(paper_key)
-                return [f"✓ Removed paper \"{paper_title}\" from reading list: {list_name}"]
-            else:
-                return [f"⚠ Failed to remove paper from reading list '{list_name}'. The list or paper may not exist."]
+        if success:
+            return [f"✓ Created reading list: {list_name}"]
+        else:
+            return [f"⚠ Reading list '{list_name}' already exists."]
+    
+    async def _reading_list_add(self, message, command_info):
+        """Add paper to a reading list"""
+        list_name = command_info["list_name"]
+        paper_index = command_info["paper_index"]
+        
+        paper_key, paper, paper_title = self.bibliography.get_paper_entry(paper_index)
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
+        
+        success = self.reading_lists.add_paper_to_list(message.channel.id, list_name, paper_key)
+        if success:
+            return [f"✓ Added paper \"{paper_title}\" to reading list: {list_name}"]
+        else:
+            return [f"⚠ Failed to add paper to reading list '{list_name}'. The list may not exist."]
+    
+    async def _reading_list_view(self, message, command_info):
+        """View a specific reading list"""
+        list_name = command_info["list_name"]
+        paper_titles = self.bibliography.get_display_titles()
+        formatted_list = self.reading_lists.format_lists(message.channel.id, list_name, paper_titles)
+        
+        if formatted_list:
+            return self.split_message(formatted_list)
+        else:
+            return [f"⚠ Reading list '{list_name}' not found."]
+    
+    async def _reading_list_view_all(self, message, command_info):
+        """View all reading lists"""
+        formatted_lists = self.reading_lists.format_lists(message.channel.id)
         
-        # Delete a reading list
-        elif command_info["command"] == "delete":
-            list_name = command_info["list_name"]
-            success = self.reading_lists.delete_list(conversation_id, list_name)
-            
-            if success:
-                return [f"✓ Deleted reading list: {list_name}"]
-            else:
-                return [f"⚠ Reading list '{list_name}' not found."]
+        if formatted_lists:
+            return self.split_message(formatted_lists)
+        else:
+            return ["You don't have any reading lists yet. Create one with '!reading_list create <name>'."]
+    
+    async def _reading_list_remove(self, message, command_info):
+        """Remove paper from a reading list"""
+        list_name = command_info["list_name"]
+        paper_index = command_info["paper_index"]
+        
+        paper_key, paper, paper_title = self.bibliography.get_paper_entry(paper_index)
+        if not paper_key:
+            return [f"Paper {paper_index} not found. Use 'list papers' to see available papers."]
+        
+        success = self.reading_lists.remove_paper_from_list(message.channel.id, list_name, paper_key)
+        if success:
+            return [f"✓ Removed paper \"{paper_title}\" from reading list: {list_name}"]
+        else:
+            return [f"⚠ Failed to remove paper from reading list '{list_name}'. The list or paper may not exist."]
+    
+    async def _reading_list_delete(self, message, command_info):
+        """Delete a reading list"""
+        list_name = command_info["list_name"]
+        success = self.reading_lists.delete_list(message.channel.id, list_name)
         
-        return ["Unknown reading list command. Please try again."]
+        if success:
+            return [f"✓ Deleted reading list: {list_name}"]
+        else:
+            return [f"⚠ Reading list '{list_name}' not found."]
     
     def split_message(self, content):
         if len(content) <= 2000:
             return [content]
         
+        # Walk the string with a cursor so the remaining text is never copied
         chunks = []
-        while len(content) > 2000:
-            split_index = content.rfind('\n', 0, 2000)
-            if split_index == -1:  # If no newline found, force split at 2000
-                split_index = 2000
+        start = 0
+        end = len(content)
+        while end - start > 2000:
+            split_index = content.rfind('\n', start, start + 2000)
+            if split_index <= start:  # If no newline found, force split at 2000
+                split_index = start + 2000
             
-            chunks.append(content[:split_index])
-            content = content[split_index:].lstrip()
+            chunks.append(content[start:split_index])
+            start = split_index
+            while start < end and content[start].isspace():
+                start += 1
         
-        if content:
-            chunks.append(content)
+        if start < end:
+            chunks.append(content[start:])
         
-        return chunks
\ No newline at end of file
+        return chunks
@@ -1,16 +1,159 @@
 from citation_formatter import format_citation, get_available_styles
 import re
-from collections import Counter
+from datetime import date
+from functools import lru_cache
+
+_AVAILABLE_STYLES = frozenset(get_available_styles())
+
+_WORD_RE = re.compile(r'\b\w+\b')
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
+    'of', 'in', 'to', 'for', 'with', 'on', 'at', 'from', 'by', 'about',
+    'as', 'into', 'like', 'through', 'after', 'over', 'between', 'out',
+    'against', 'during', 'without', 'before', 'under', 'around', 'among',
+})
+
+@lru_cache(maxsize=4096)
+def _tokenize_text(text):
+    """
+    Tokenize text and remove common stop words. Results are cached, since the same
+    titles and abstracts are tokenized again for every pair of papers compared
+    
+    Parameters:
+    text (str): Text to tokenize
+    
+    Returns:
+    tuple: Significant words, in order
+    """
+    if not text:
+        return ()
+    
+    # Convert to lowercase and split by non-alphanumeric characters
+    return tuple(word for word in _WORD_RE.findall(text.lower()) if word not in _STOP_WORDS and len(word) > 2)
+
+def _jaccard(words1, words2):
+    """
+    Jaccard similarity of two word sets, computed from the intersection size alone
+    
+    Parameters:
+    words1 (frozenset): First set of words
+    words2 (frozenset): Second set of words
+    
+    Returns:
+    float: Intersection size over union size, or 0.0 if either set is empty
+    """
+    if not words1 or not words2:
+        return 0.0
+    common = len(words1 & words2)
+    return common / (len(words1) + len(words2) - common)
 
 class Bibliography:
     def __init__(self):
         self.cited_papers = {}
+        # (key, paper) pairs in citation order, so 1-based indexes resolve without copying the dict
+        self._papers_ordered = []
+        # Formatted citations keyed by (paper_key, style), and whole bibliographies keyed by style.
+        # MLA and Harvard citations include today's date, so both are dropped when the day changes.
+        self._citation_cache = {}
+        self._bibliography_cache = {}
+        self._cache_date = date.today()
+        # Similarity features per paper key, computed once when the paper is added
+        self._author_sets = {}
+        self._title_words = {}
+        self._title_tokens = {}
+        self._abstract_tokens = {}
+        self._years = {}
+        # Inverted index from similarity feature to the keys of papers that have it, so related
+        # papers are looked up rather than scanned; features are tagged tuples like ("title", word)
+        self._feature_index = {}
+        self._positions = {}
+        # "Title (year)" strings used wherever a paper is named in a reply
+        self._display_titles = {}
 
     def add_paper(self, paper):
-        key = f"{paper['title']}_{paper['year']}"
-        if key not in self.cited_papers:
-            self.cited_papers[key] = paper
-        return key  # Return the paper key for use with notes
+        return self.add_papers([paper])[0]  # Return the paper key for use with notes
+
+    def add_papers(self, papers):
+        """
+        Add a batch of papers to the bibliography, skipping ones already cited
+        
+        Parameters:
+        papers (list): Paper dicts with at least title and year
+        
+        Returns:
+        list: Keys of the papers, in the order given
+        """
+        keys = []
+        for paper in papers:
+            key = f"{paper['title']}_{paper['year']}"
+            if key not in self.cited_papers:
+                self.cited_papers[key] = paper
+                self._positions[key] = len(self._papers_ordered)
+                self._papers_ordered.append((key, paper))
+                self._display_titles[key] = f"{paper['title']} ({paper['year']})"
+                self._index_paper(key, paper)
+                self._bibliography_cache.clear()
+            keys.append(key)
+        return keys
+
+    def _index_paper(self, key, paper):
+        """Precompute the author and token sets used to compare a paper with others"""
+        self._author_sets[key] = frozenset(author.lower() for author in paper.get('authors', []))
+        
+        title_words = _tokenize_text(paper.get('title', ''))
+        self._title_words[key] = title_words
+        self._title_tokens[key] = frozenset(title_words)
+        
+        self._abstract_tokens[key] = frozenset(_tokenize_text(paper.get('abstract', paper.get('snippet', ''))))
+        self._years[key] = paper.get('year')
+        
+        for feature in self._paper_features(key):
+            self._feature_index.setdefault(feature, set()).add(key)
+
+    def _paper_features(self, key):
+        """
+        List the features that can give a paper a non-zero similarity to another
+        
+        Parameters:
+        key (str): Key of the paper
+        
+        Returns:
+        list: Tagged feature tuples for its authors, title words, abstract words and year
+        """
+        features = [("author", author) for author in self._author_sets[key]]
+        features.extend(("title", word) for word in self._title_tokens[key])
+        features.extend(("abstract", word) for word in self._abstract_tokens[key])
+        features.append(("year", self._years[key]))
+        return features
+
+    def _check_cache_date(self):
+        """Drop cached citations formatted on a previous day"""
+        today = date.today()
+        if today != self._cache_date:
+            self._citation_cache.clear()
+            self._bibliography_cache.clear()
+            self._cache_date = today
+
+    def _format_citation(self, paper_key, style):
+        """
+        Format a paper's citation, reusing an earlier result for the same style
+        
+        Parameters:
+        paper_key (str): Key of the paper
+        style (str): Lowercase citation style
+        
+        Returns:
+        str: Formatted citation
+        """
+        # Unknown styles fall back to APA, so they share its cache entries
+        if style not in _AVAILABLE_STYLES:
+            style = "apa"
+        cache_key = (paper_key, style)
+        citation = self._citation_cache.get(cache_key)
+        if citation is None:
+            citation = format_citation(self.cited_papers[paper_key], style)
+            self._citation_cache[cache_key] = citation
+        return citation
 
     def get_formatted_bibliography(self, style="apa"):
         """
@@ -26,11 +169,21 @@ class Bibliography:
             return "No papers have been cited in this conversation."
 
         style = style.lower()
-        formatted_bib = f"Bibliography ({style.upper()} format):\n\n"
-        
-        for i, paper in enumerate(self.cited_papers.values(), 1):
-            formatted_bib += f"{i}. {format_citation(paper, style)}\n\n"
-        
+        self._check_cache_date()
+        formatted_bib = self._bibliography_cache.get(style)
+        if formatted_bib is not None:
+            return formatted_bib
+        
+        parts = [f"Bibliography ({style.upper()} format):\n\n"]
+        parts.extend(
+            f"{i}. {self._format_citation(key, style)}\n\n"
+            for i, (key, _) in enumerate(self._papers_ordered, 1)
+        )
+        formatted_bib = "".join(parts)
+        
+        # Only known styles are kept, so arbitrary style names cannot grow the cache
+        if style in _AVAILABLE_STYLES:
+            self._bibliography_cache[style] = formatted_bib
         return formatted_bib
     
     def get_citation(self, paper_index, style="apa"):
@@ -44,18 +197,17 @@ class Bibliography:
         Returns:
         str: Formatted citation or error message
         """
-        papers = list(self.cited_papers.values())
-        
-        if not papers:
+        if not self._papers_ordered:
             return "No papers have been cited in this conversation."
         
         try:
             paper_index = int(paper_index)
-            if paper_index < 1 or paper_index > len(papers):
-                return f"Invalid paper index. Valid range is 1-{len(papers)}."
+            if paper_index < 1 or paper_index > len(self._papers_ordered):
+                return f"Invalid paper index. Valid range is 1-{len(self._papers_ordered)}."
             
-            paper = papers[paper_index - 1]
-            return format_citation(paper, style)
+            self._check_cache_date()
+            paper_key, _ = self._papers_ordered[paper_index - 1]
+            return self._format_citation(paper_key, style.lower())
         
         except ValueError:
             return "Invalid paper index. Please provide a number."
@@ -70,11 +222,12 @@ class Bibliography:
         if not self.cited_papers:
             return "No papers have been cited in this conversation."
             
-        formatted_list = "Cited Papers:\n\n"
-        for i, paper in enumerate(self.cited_papers.values(), 1):
-            formatted_list += f"{i}. {paper['title']} ({paper['year']})\n"
-        
-        return formatted_list
+        parts = ["Cited Papers:\n\n"]
+        parts.extend(
+            f"{i}. {self._display_titles[key]}\n"
+            for i, (key, _) in enumerate(self._papers_ordered, 1)
+        )
+        return "".join(parts)
     
     def get_paper_by_index(self, paper_index):
         """
@@ -88,15 +241,29 @@ class Bibliography:
         """
         try:
             paper_index = int(paper_index)
-            papers = list(self.cited_papers.items())
             
-            if 1 <= paper_index <= len(papers):
-                return papers[paper_index - 1]
+            if 1 <= paper_index <= len(self._papers_ordered):
+                return self._papers_ordered[paper_index - 1]
             
             return None, None
         except (ValueError, IndexError):
             return None, None
     
+    def get_paper_entry(self, paper_index):
+        """
+        Get a paper by its index in the bibliography, together with its display title
+        
+        Parameters:
+        paper_index (int): Index of the paper (1-based)
+        
+        Returns:
+        tuple: (paper_key, paper_dict, "Title (year)") if found, (None, None, None) otherwise
+        """
+        paper_key, paper = self.get_paper_by_index(paper_index)
+        if not paper_key:
+            return None, None, None
+        return paper_key, paper, self._display_titles[paper_key]
+    
     def get_paper_info_dict(self):
         """
         Get a dictionary of paper keys to paper info
@@ -106,6 +273,15 @@ class Bibliography:
         """
         return self.cited_papers
     
+    def get_display_titles(self):
+        """
+        Get the display titles of all cited papers
+        
+        Returns:
+        dict: Dictionary mapping paper keys to "Title (year)" strings; shared, do not modify
+        """
+        return self._display_titles
+    
     def get_paper_title(self, paper_key):
         """
         Get the title of a paper by its key
@@ -116,9 +292,7 @@ class Bibliography:
         Returns:
         str: The title of the paper, or None if not found
         """
-        if paper_key in self.cited_papers:
-            return f"{self.cited_papers[paper_key]['title']} ({self.cited_papers[paper_key]['year']})"
-        return None
+        return self._display_titles.get(paper_key)
         
     def find_related_papers(self, paper_index, max_results=5):
         """
@@ -135,22 +309,25 @@ class Bibliography:
         if not paper_key:
             return f"Paper {paper_index} not found. Use 'list papers' to see available papers."
             
-        papers = list(self.cited_papers.items())
-        if len(papers) <= 1:
+        if len(self._papers_ordered) <= 1:
             return "Not enough papers in the bibliography to find related papers."
             
-        # Calculate similarity scores between target paper and all other papers
+        # Only papers sharing an author, a title or abstract word, or the year can score above
+        # zero, so the candidates come from the feature index instead of the whole bibliography
+        candidates = set()
+        for feature in self._paper_features(paper_key):
+            candidates.update(self._feature_index[feature])
+        candidates.discard(paper_key)  # Skip the target paper
+        
+        # Calculate similarity scores between target paper and the candidates, in citation order
         related_papers = []
         
-        for key, paper in papers:
-            if key == paper_key:  # Skip the target paper
-                continue
-                
-            similarity_score = self._calculate_similarity(target_paper, paper)
+        for key in sorted(candidates, key=self._positions.__getitem__):
+            similarity_score, reason = self._score_and_explain(paper_key, key)
             related_papers.append({
-                "key": key,
-                "paper": paper,
-                "similarity_score": similarity_score
+                "paper": self.cited_papers[key],
+                "similarity_score": similarity_score,
+                "reason": reason
             })
             
         # Sort by similarity score (higher is more related)
@@ -160,129 +337,75 @@ class Bibliography:
         if not related_papers:
             return "No related papers found."
             
-        formatted_result = f"Papers related to '{target_paper['title']}':\n\n"
+        parts = [f"Papers related to '{target_paper['title']}':\n\n"]
         
         for i, paper_data in enumerate(related_papers[:max_results], 1):
             paper = paper_data["paper"]
-            score = paper_data["similarity_score"]
-            formatted_result += f"{i}. {paper['title']} ({paper['year']})\n"
-            formatted_result += f"   Authors: {', '.join(paper.get('authors', ['Unknown']))}\n"
-            formatted_result += f"   Similarity: {score:.2f}\n"
-            formatted_result += f"   Reason: {self._explain_similarity(target_paper, paper)}\n\n"
+            parts.append(
+                f"{i}. {paper['title']} ({paper['year']})\n"
+                f"   Authors: {', '.join(paper.get('authors', ['Unknown']))}\n"
+                f"   Similarity: {paper_data['similarity_score']:.2f}\n"
+                f"   Reason: {paper_data['reason']}\n\n"
+            )
             
-        return formatted_result
+        return "".join(parts)
     
-    def _calculate_similarity(self, paper1, paper2):
+    def _score_and_explain(self, key1, key2):
         """
-        Calculate a similarity score between two papers
+        Calculate a similarity score between two papers and explain it, computing each
+        shared-feature set once for both
         
         Parameters:
-        paper1 (dict): First paper
-        paper2 (dict): Second paper
+        key1 (str): Key of the first paper
+        key2 (str): Key of the second paper
         
         Returns:
-        float: Similarity score (0-1, higher means more similar)
+        tuple: (similarity score from 0-1, higher means more similar; explanation string)
         """
+        reasons = []
         score = 0.0
         
-        # Check for common authors (highest weight)
-        authors1 = set(author.lower() for author in paper1.get('authors', []))
-        authors2 = set(author.lower() for author in paper2.get('authors', []))
-        
-        if authors1 and authors2:  # Only if both have authors
-            common_authors = authors1.intersection(authors2)
-            if common_authors:
-                score += 0.4 * (len(common_authors) / max(len(authors1), len(authors2)))
-        
-        # Check for similar titles
-        title1_words = self._tokenize_text(paper1.get('title', ''))
-        title2_words = self._tokenize_text(paper2.get('title', ''))
+        # Check if they're in the same year first, as the cheapest signal (small boost).
+        # The boost is added last, after the other signals, as in the original summation order.
+        year = self._years[key1]
+        year_boost = 0.1 if year == self._years[key2] else 0.0
         
-        if title1_words and title2_words:
-            common_words = set(title1_words).intersection(set(title2_words))
-            title_similarity = len(common_words) / max(len(title1_words), len(title2_words))
-            score += 0.3 * title_similarity
-        
-        # Check for similar abstracts/snippets
-        abstract1 = paper1.get('abstract', paper1.get('snippet', ''))
-        abstract2 = paper2.get('abstract', paper2.get('snippet', ''))
-        
-        if abstract1 and abstract2:
-            abstract1_words = self._tokenize_text(abstract1)
-            abstract2_words = self._tokenize_text(abstract2)
-            
-            common_words = set(abstract1_words).intersection(set(abstract2_words))
-            abstract_similarity = len(common_words) / max(len(abstract1_words), len(abstract2_words))
-            score += 0.2 * abstract_similarity
-        
-        # Check if they're in the same year (small boost)
-        if paper1.get('year') == paper2.get('year'):
-            score += 0.1
-            
-        return score
-    
-    def _tokenize_text(self, text):
-        """
-        Tokenize text and remove common stop words
-        
-        Parameters:
-        text (str): Text to tokenize
-        
-        Returns:
-        list: List of significant words
-        """
-        if not text:
-            return []
-            
-        # Convert to lowercase and split by non-alphanumeric characters
-        words = re.findall(r'\b\w+\b', text.lower())
-        
-        # Remove common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 
-                      'of', 'in', 'to', 'for', 'with', 'on', 'at', 'from', 'by', 'about', 
-                      'as', 'into', 'like', 'through', 'after', 'over', 'between', 'out', 
-                      'against', 'during', 'without', 'before', 'under', 'around', 'among'}
-        
-        return [word for word in words if word not in stop_words and len(word) > 2]
-    
-    def _explain_similarity(self, paper1, paper2):
-        """
-        Generate an explanation for why two papers are similar
-        
-        Parameters:
-        paper1 (dict): First paper
-        paper2 (dict): Second paper
-        
-        Returns:
-        str: Explanation of similarity
-        """
-        reasons = []
-        
-        # Check for common authors
-        authors1 = set(author.lower() for author in paper1.get('authors', []))
-        authors2 = set(author.lower() for author in paper2.get('authors', []))
-        common_authors = authors1.intersection(authors2)
+        # Check for common authors (highest weight)
+        authors1 = self._author_sets[key1]
+        authors2 = self._author_sets[key2]
+        common_authors = authors1 & authors2
         
         if common_authors:
-            authors_str = ', '.join(common_authors)
-            reasons.append(f"Shares author(s): {authors_str}")
-        
-        # Check for similar titles
-        title1_words = self._tokenize_text(paper1.get('title', ''))
-        title2_words = self._tokenize_text(paper2.get('title', ''))
-        common_title_words = Counter([w for w in title1_words if w in title2_words])
-        
-        if common_title_words:
-            top_words = [word for word, _ in common_title_words.most_common(3)]
-            if top_words:
-                reasons.append(f"Similar topic keywords: {', '.join(top_words)}")
+            score += 0.4 * (len(common_authors) / max(len(authors1), len(authors2)))
+            reasons.append(f"Shares author(s): {', '.join(common_authors)}")
+        
+        # Check for similar titles by Jaccard similarity; the first three shared words,
+        # in title order, are reported as keywords
+        title1 = self._title_tokens[key1]
+        title2 = self._title_tokens[key2]
+        common_title = title1 & title2
+        
+        if common_title:
+            score += 0.3 * (len(common_title) / (len(title1) + len(title2) - len(common_title)))
+            top_words = []
+            for word in self._title_words[key1]:
+                if word in common_title and word not in top_words:
+                    top_words.append(word)
+                    if len(top_words) == 3:
+                        break
+            reasons.append(f"Similar topic keywords: {', '.join(top_words)}")
+        
+        # Check for similar abstracts/snippets; papers without one skip the comparison
+        abstract1 = self._abstract_tokens[key1]
+        abstract2 = self._abstract_tokens[key2]
+        if abstract1 and abstract2:
+            score += 0.2 * _jaccard(abstract1, abstract2)
         
-        # Check if they're from the same year
-        if paper1.get('year') == paper2.get('year'):
-            reasons.append(f"Published in the same year ({paper1.get('year')})")
+        if year_boost:
+            reasons.append(f"Published in the same year ({year})")
         
         # If no specific reasons found, give a generic response
         if not reasons:
             reasons.append("Related based on content similarity")
         
-        return '; '.join(reasons)
\ No newline at end of file
+        return score + year_boost, '; '.join(reasons)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import discord
 import logging
 
@@ -8,6 +9,7 @@ from agent import MistralAgent
 from citation_formatter import get_available_styles
 
 PREFIX = "!"
+TYPING_DELAY = 1.0  # Seconds to wait for a reply before showing the typing indicator
 
 # Setup logging
 logger = logging.getLogger("discord")
@@ -15,15 +17,28 @@ logger = logging.getLogger("discord")
 # Load the environment variables
 load_dotenv()
 
-# Create the bot with all intents
-# The message content and members intent must be enabled in the Discord Developer Portal for the bot to work.
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None)
+# Create the bot with only the intents it uses: guild messages and their content.
+# Presence and member events are never read, so they are left off, and guild members
+# are not fetched at startup.
+# The message content intent must be enabled in the Discord Developer Portal for the bot to work.
+intents = discord.Intents.default()
+intents.message_content = True
+bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None, chunk_guilds_at_startup=False)
 
 # Import the Mistral agent from the agent.py file
 agent = MistralAgent()
 
 
+async def send_chunks(ctx, text):
+    """
+    Send text that may be longer than Discord's message limit as consecutive messages.
+    Chunks are awaited one at a time because concurrent sends are not guaranteed to
+    arrive in order, and a bibliography or notes list split out of order is unreadable.
+    """
+    for chunk in agent.split_message(text):
+        await ctx.send(chunk)
+
+
 # Get the token from the environment variables
 token = os.getenv("DISCORD_TOKEN")
 
@@ -46,32 +61,45 @@ async def on_message(message: discord.Message):
 
     https://discordpy.readthedocs.io/en/latest/api.html#discord.on_message
     """
+    # Ignore messages from self or other bots to prevent infinite loops.
+    # Bot commands are ignored by process_commands anyway, so skip it for them too.
+    if message.author.bot:
+        return
+
     # Don't delete this line! It's necessary for the bot to process commands.
     await bot.process_commands(message)
 
-    # Ignore messages from self or other bots to prevent infinite loops.
-    if message.author.bot or message.content.startswith("!"):
+    # Prefixed messages are commands, which process_commands has already handled
+    if message.content.startswith(PREFIX):
         return
 
     # Process the message with the agent you wrote
     # Open up the agent.py file to customize the agent
     logger.info(f"Processing message from {message.author}: {message.content}")
     
-    # Show typing indicator while processing the request
-    async with message.channel.typing():
-        response = await agent.run(message)
-
-    # Handle both single responses and response chunks
-    if isinstance(response, list):
-        # Send the first chunk as a reply
-        await message.reply(response[0])
-        
-        # Send subsequent chunks as follow-up messages
-        for chunk in response[1:]:
-            await message.channel.send(chunk)
+    # Only show the typing indicator if the reply is not ready almost immediately, so
+    # commands answered from memory don't cost an extra typing request to Discord
+    chunks = agent.stream(message)
+    first_chunk = asyncio.ensure_future(anext(chunks, None))
+    done, _ = await asyncio.wait({first_chunk}, timeout=TYPING_DELAY)
+    if done:
+        await send_stream(message, first_chunk.result(), chunks)
     else:
-        # Send the response back to the channel
-        await message.reply(response)
+        async with message.channel.typing():
+            await send_stream(message, await first_chunk, chunks)
+
+
+async def send_stream(message, first_chunk, chunks):
+    """
+    Reply to a message with the first chunk of the agent's response, then send the
+    remaining chunks as follow-up messages as soon as the agent produces them.
+    """
+    if first_chunk is None:
+        return
+    
+    await message.reply(first_chunk)
+    async for chunk in chunks:
+        await message.channel.send(chunk)
 
 
 # Commands
@@ -104,9 +132,7 @@ async def bibliography(ctx, style: str = "apa"):
     bib = agent.bibliography.get_formatted_bibliography(style)
     
     # Split long messages
-    chunks = agent.split_message(bib)
-    for chunk in chunks:
-        await ctx.send(chunk)
+    await send_chunks(ctx, bib)
 
 @bot.command(name="papers", help="Lists all cited papers.")
 async def papers(ctx):
@@ -137,8 +163,8 @@ async def add_note(ctx, paper_index: int, *, note_text):
     Usage: !add_note <paper_index> <note_text>
     Example: !add_note 1 This paper has an interesting methodology.
     """
-    conversation_id = str(ctx.channel.id)
-    paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
+    conversation_id = ctx.channel.id
+    paper_key, paper, paper_title = agent.bibliography.get_paper_entry(paper_index)
     
     if not paper_key:
         await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
@@ -147,7 +173,6 @@ async def add_note(ctx, paper_index: int, *, note_text):
     success = agent.notes.add_note(conversation_id, paper_key, note_text)
     
     if success:
-        paper_title = agent.bibliography.get_paper_title(paper_key)
         await ctx.send(f"✓ Note added to paper: {paper_title}")
     else:
         await ctx.send("⚠ Failed to add note. Please try again.")
@@ -160,8 +185,8 @@ async def view_notes(ctx, paper_index: int = None):
     Usage: !view_notes [paper_index]
     Example: !view_notes 1
     """
-    conversation_id = str(ctx.channel.id)
-    paper_info = agent.bibliography.get_paper_info_dict()
+    conversation_id = ctx.channel.id
+    paper_titles = agent.bibliography.get_display_titles()
     
     if paper_index is not None:
         paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
@@ -169,14 +194,12 @@ async def view_notes(ctx, paper_index: int = None):
             await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
             return
         
-        formatted_notes = agent.notes.format_notes(conversation_id, paper_key, paper_info)
+        formatted_notes = agent.notes.format_notes(conversation_id, paper_key, paper_titles)
     else:
-        formatted_notes = agent.notes.format_notes(conversation_id, paper_info=paper_info)
+        formatted_notes = agent.notes.format_notes(conversation_id, paper_titles=paper_titles)
     
     # Split long messages
-    chunks = agent.split_message(formatted_notes)
-    for chunk in chunks:
-        await ctx.send(chunk)
+    await send_chunks(ctx, formatted_notes)
 
 @bot.command(name="delete_note", help="Delete a note from a paper.")
 async def delete_note(ctx, paper_index: int, note_index: int):
@@ -186,8 +209,8 @@ async def delete_note(ctx, paper_index: int, note_index: int):
     Usage: !delete_note <paper_index> <note_index>
     Example: !delete_note 1 2
     """
-    conversation_id = str(ctx.channel.id)
-    paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
+    conversation_id = ctx.channel.id
+    paper_key, paper, paper_title = agent.bibliography.get_paper_entry(paper_index)
     
     if not paper_key:
         await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
@@ -197,7 +220,6 @@ async def delete_note(ctx, paper_index: int, note_index: int):
     success = agent.notes.delete_note(conversation_id, paper_key, note_index - 1)
     
     if success:
-        paper_title = agent.bibliography.get_paper_title(paper_key)
         await ctx.send(f"✓ Note {note_index} deleted from paper: {paper_title}")
     else:
         await ctx.send(f"⚠ Note {note_index} not found for paper {paper_index}.")
@@ -210,17 +232,16 @@ async def clear_notes(ctx, paper_index: int = None):
     Usage: !clear_notes [paper_index]
     Example: !clear_notes 1
     """
-    conversation_id = str(ctx.channel.id)
+    conversation_id = ctx.channel.id
     
     if paper_index is not None:
-        paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
+        paper_key, paper, paper_title = agent.bibliography.get_paper_entry(paper_index)
         if not paper_key:
             await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
             return
         
         success = agent.notes.clear_notes(conversation_id, paper_key)
         if success:
-            paper_title = agent.bibliography.get_paper_title(paper_key)
             await ctx.send(f"✓ All notes cleared for paper: {paper_title}")
         else:
             await ctx.send("⚠ Failed to clear notes. Please try again.")
@@ -247,66 +268,73 @@ async def reading_list(ctx, action: str, name: str = None, paper_index: int = No
     !reading_list view (shows all lists)
     !reading_list remove ML_Healthcare 2
     """
-    conversation_id = str(ctx.channel.id)
-    
-    # Create a new reading list
-    if action.lower() == "create" and name:
-        success = agent.reading_lists.create_list(conversation_id, name)
-        if success:
-            await ctx.send(f"✓ Created reading list: {name}")
-        else:
-            await ctx.send(f"⚠ Reading list '{name}' already exists or could not be created.")
-    
-    # Add a paper to a reading list
-    elif action.lower() == "add" and name and paper_index is not None:
-        paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
-        if not paper_key:
-            await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
-            return
-        
-        success = agent.reading_lists.add_paper_to_list(conversation_id, name, paper_key)
-        if success:
-            paper_title = agent.bibliography.get_paper_title(paper_key)
-            await ctx.send(f"✓ Added paper \"{paper_title}\" to reading list: {name}")
-        else:
-            await ctx.send(f"⚠ Reading list '{name}' not found or paper could not be added.")
+    handler, needs_name, needs_paper = READING_LIST_ACTIONS.get(action.lower(), (None, False, False))
+    if handler is None or (needs_name and not name) or (needs_paper and paper_index is None):
+        await ctx.send("Invalid command. Use !help reading_list for usage information.")
+        return
     
-    # View a specific reading list or all lists
-    elif action.lower() == "view":
-        paper_info = agent.bibliography.get_paper_info_dict()
-        if name:
-            formatted_list = agent.reading_lists.format_lists(conversation_id, name, paper_info)
-        else:
-            formatted_list = agent.reading_lists.format_lists(conversation_id)
-        
-        chunks = agent.split_message(formatted_list)
-        for chunk in chunks:
-            await ctx.send(chunk)
+    await handler(ctx, ctx.channel.id, name, paper_index)
+
+async def reading_list_create(ctx, conversation_id, name, paper_index):
+    """Create a new reading list"""
+    success = agent.reading_lists.create_list(conversation_id, name)
+    if success:
+        await ctx.send(f"✓ Created reading list: {name}")
+    else:
+        await ctx.send(f"⚠ Reading list '{name}' already exists or could not be created.")
+
+async def reading_list_add(ctx, conversation_id, name, paper_index):
+    """Add a paper to a reading list"""
+    paper_key, paper, paper_title = agent.bibliography.get_paper_entry(paper_index)
+    if not paper_key:
+        await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
+        return
     
-    # Remove a paper from a reading list
-    elif action.lower() == "remove" and name and paper_index is not None:
-        paper_key, paper = agent.bibliography.get_paper_by_index(paper_index)
-        if not paper_key:
-            await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
-            return
-        
-        success = agent.reading_lists.remove_paper_from_list(conversation_id, name, paper_key)
-        if success:
-            paper_title = agent.bibliography.get_paper_title(paper_key)
-            await ctx.send(f"✓ Removed paper \"{paper_title}\" from reading list: {name}")
-        else:
-            await ctx.send(f"⚠ Reading list '{name}' not found or paper not in list.")
+    success = agent.reading_lists.add_paper_to_list(conversation_id, name, paper_key)
+    if success:
+        await ctx.send(f"✓ Added paper \"{paper_title}\" to reading list: {name}")
+    else:
+        await ctx.send(f"⚠ Reading list '{name}' not found or paper could not be added.")
+
+async def reading_list_view(ctx, conversation_id, name, paper_index):
+    """View a specific reading list or all lists"""
+    paper_titles = agent.bibliography.get_display_titles()
+    if name:
+        formatted_list = agent.reading_lists.format_lists(conversation_id, name, paper_titles)
+    else:
+        formatted_list = agent.reading_lists.format_lists(conversation_id)
     
-    # Delete a reading list
-    elif action.lower() == "delete" and name:
-        success = agent.reading_lists.delete_list(conversation_id, name)
-        if success:
-            await ctx.send(f"✓ Deleted reading list: {name}")
-        else:
-            await ctx.send(f"⚠ Reading list '{name}' not found.")
+    await send_chunks(ctx, formatted_list)
+
+async def reading_list_remove(ctx, conversation_id, name, paper_index):
+    """Remove a paper from a reading list"""
+    paper_key, paper, paper_title = agent.bibliography.get_paper_entry(paper_index)
+    if not paper_key:
+        await ctx.send(f"Paper {paper_index} not found. Use !papers to see available papers.")
+        return
     
+    success = agent.reading_lists.remove_paper_from_list(conversation_id, name, paper_key)
+    if success:
+        await ctx.send(f"✓ Removed paper \"{paper_title}\" from reading list: {name}")
     else:
-        await ctx.send("Invalid command. Use !help reading_list for usage information.")
+        await ctx.send(f"⚠ Reading list '{name}' not found or paper not in list.")
+
+async def reading_list_delete(ctx, conversation_id, name, paper_index):
+    """Delete a reading list"""
+    success = agent.reading_lists.delete_list(conversation_id, name)
+    if success:
+        await ctx.send(f"✓ Deleted reading list: {name}")
+    else:
+        await ctx.send(f"⚠ Reading list '{name}' not found.")
+
+# Reading list action -> (handler, needs a list name, needs a paper index)
+READING_LIST_ACTIONS = {
+    "create": (reading_list_create, True, False),
+    "add": (reading_list_add, True, True),
+    "view": (reading_list_view, False, False),
+    "remove": (reading_list_remove, True, True),
+    "delete": (reading_list_delete, True, False),
+}
 
 @bot.command(name="related", help="Find papers related to a specific paper.")
 async def related(ctx, paper_index: int, max_results: int = 5):
@@ -318,17 +346,12 @@ async def related(ctx, paper_index: int, max_results: int = 5):
     """
     result = agent.bibliography.find_related_papers(paper_index, max_results)
     
-    chunks = agent.split_message(result)
-    for chunk in chunks:
-        await ctx.send(chunk)
+    await send_chunks(ctx, result)
 
-@bot.command(name="help", help="Shows detailed help information about bot commands and features.")
-async def help_command(ctx, command: str = None):
+def build_help_embed(command=None):
     """
-    Display detailed help information about the bot's commands and features.
-    
-    Usage: !help [command]
-    Examples: !help, !help cite, !help reading_list
+    Build the help embed for a command, or the general overview when command is None.
+    Unknown commands get a "not found" embed that names the command.
     """
     embed = discord.Embed(title="Research Assistant Bot Help", color=discord.Color.blue())
     
@@ -525,6 +548,34 @@ async def help_command(ctx, command: str = None):
     else:
         embed.description = f"Command `{command}` not found. Use `!help` to see all available commands."
     
+    return embed
+
+# Help embeds never change, so build them once instead of on every !help
+HELP_EMBEDS = {
+    topic: build_help_embed(topic)
+    for topic in (
+        None, "cite", "bibliography", "papers", "citation_styles", "add_note",
+        "view_notes", "delete_note", "clear_notes", "reading_list", "related",
+    )
+}
+
+@bot.command(name="help", help="Shows detailed help information about bot commands and features.")
+async def help_command(ctx, command: str = None):
+    """
+    Display detailed help information about the bot's commands and features.
+    
+    Usage: !help [command]
+    Examples: !help, !help cite, !help reading_list
+    """
+    topic = command.lower() if command is not None else None
+    embed = HELP_EMBEDS.get(topic)
+    if embed is None:
+        embed = build_help_embed(command)
+    
     await ctx.send(embed=embed)
 
-bot.run(token)
\ No newline at end of file
+bot.run(token)
+
+# Write out any note or reading list changes still waiting on the save delay
+agent.notes.flush()
+agent.reading_lists.flush()
\ No newline at end of file
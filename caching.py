@@ -0,0 +1,57 @@
+"""
+Small in-memory caches for results that are expensive to recompute.
+"""
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds an entry stays valid, or None to keep entries until evicted
+        self._entries = OrderedDict()  # key -> (value, expiry time or None)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Get a cached value and mark it as recently used
+        
+        Parameters:
+        key: Cache key
+        default: Value to return if the key is not cached or has expired
+        
+        Returns:
+        The cached value, or default if not found
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry when the cache is full
+        
+        Parameters:
+        key: Cache key
+        value: Value to store
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._entries)
@@ -1,6 +1,8 @@
 """
 Functions for formatting citations in different styles (APA, MLA, Chicago, etc.)
 """
+from datetime import date
+from functools import lru_cache
 
 def format_apa(paper):
     """
@@ -62,11 +64,16 @@ def format_ieee(paper):
     return citation
 
 # Helper functions for author formatting
+@lru_cache(maxsize=512)
+def _split_authors(authors):
+    """Split a comma-separated author string into a tuple of names"""
+    return tuple(authors.split(", "))
+
 def format_apa_authors(authors):
     """Format authors in APA style"""
     if isinstance(authors, str):
         # If we have a string of authors, try to split and format
-        author_list = authors.split(", ")
+        author_list = _split_authors(authors)
         if len(author_list) == 1:
             return authors
         elif len(author_list) == 2:
@@ -78,21 +85,19 @@ def format_apa_authors(authors):
 def format_mla_authors(authors):
     """Format authors in MLA style"""
     if isinstance(authors, str):
-        author_list = authors.split(", ")
+        author_list = _split_authors(authors)
         if len(author_list) == 1:
             return authors
-        elif len(author_list) > 1:
-            # MLA uses first author's last name, then "et al." for 3+ authors
-            if len(author_list) > 2:
-                return f"{author_list[0]} et al"
-            else:
-                return f"{author_list[0]} and {author_list[1]}"
+        # MLA uses first author's last name, then "et al." for 3+ authors
+        if len(author_list) > 2:
+            return f"{author_list[0]} et al"
+        return f"{author_list[0]} and {author_list[1]}"
     return authors
 
 def format_chicago_authors(authors):
     """Format authors in Chicago style"""
     if isinstance(authors, str):
-        author_list = authors.split(", ")
+        author_list = _split_authors(authors)
         if len(author_list) == 1:
             return authors
         elif len(author_list) == 2:
@@ -105,7 +110,7 @@ def format_chicago_authors(authors):
 def format_harvard_authors(authors):
     """Format authors in Harvard style"""
     if isinstance(authors, str):
-        author_list = authors.split(", ")
+        author_list = _split_authors(authors)
         if len(author_list) == 1:
             return authors
         elif len(author_list) == 2:
@@ -120,26 +125,44 @@ def format_harvard_authors(authors):
 
 def format_ieee_authors(authors):
     """Format authors in IEEE style"""
-    if isinstance(authors, str):
-        author_list = authors.split(", ")
-        if len(author_list) == 1:
-            return authors
-        elif len(author_list) > 1:
-            # IEEE uses first initial followed by last name
-            # For simplicity, we'll just use the provided names as-is
-            return f"{', '.join(author_list)}"
+    # IEEE uses first initial followed by last name
+    # For simplicity, we'll just use the provided names as-is, and re-joining
+    # a comma-separated string reproduces it unchanged
     return authors
 
 # Helper function to get today's date formatted for citations
+# Formatted dates keyed by (day ordinal, format); only today's entries are kept
+_DATE_CACHE = {}
+
+def _today_formatted(fmt):
+    """Return today's date formatted with fmt, computed once per day"""
+    today = date.today()
+    key = (today.toordinal(), fmt)
+    formatted = _DATE_CACHE.get(key)
+    if formatted is None:
+        if any(cached_day != key[0] for cached_day, _ in _DATE_CACHE):
+            _DATE_CACHE.clear()
+        formatted = today.strftime(fmt)
+        _DATE_CACHE[key] = formatted
+    return formatted
+
 def get_today_formatted():
     """Get today's date formatted as DD Month YYYY for MLA citations"""
-    from datetime import datetime
-    return datetime.now().strftime("%d %b. %Y")
+    return _today_formatted("%d %b. %Y")
 
 def get_today_formatted_harvard():
     """Get today's date formatted as DD Month YYYY for Harvard citations"""
-    from datetime import datetime
-    return datetime.now().strftime("%d %B %Y")
+    return _today_formatted("%d %B %Y")
+
+# Style name -> formatter; unknown styles fall back to APA in format_citation
+_STYLE_DISPATCH = {
+    "apa": format_apa,
+    "mla": format_mla,
+    "chicago": format_chicago,
+    "harvard": format_harvard,
+    "ieee": format_ieee,
+}
+_AVAILABLE_STYLES = tuple(_STYLE_DISPATCH)
 
 # Main function to format a citation in the requested style
 def format_citation(paper, style="apa"):
@@ -153,23 +176,9 @@ def format_citation(paper, style="apa"):
     Returns:
     str: Formatted citation
     """
-    style = style.lower()
-    
-    if style == "apa":
-        return format_apa(paper)
-    elif style == "mla":
-        return format_mla(paper)
-    elif style == "chicago":
-        return format_chicago(paper)
-    elif style == "harvard":
-        return format_harvard(paper)
-    elif style == "ieee":
-        return format_ieee(paper)
-    else:
-        # Default to APA if style not recognized
-        return format_apa(paper)
+    return _STYLE_DISPATCH.get(style.lower(), format_apa)(paper)
 
 # Get all available citation styles
 def get_available_styles():
-    """Return a list of all available citation styles"""
-    return ["apa", "mla", "chicago", "harvard", "ieee"]
\ No newline at end of file
+    """Return a tuple of all available citation styles"""
+    return _AVAILABLE_STYLES
\ No newline at end of file
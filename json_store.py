@@ -0,0 +1,77 @@
+"""
+Debounced, atomic JSON persistence shared by the notes and reading list stores.
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# File writes run on one shared background thread so they never block the event loop;
+# a single worker also keeps successive writes to the same file in order
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-store")
+
+def _write_file(path, text):
+    """Write text to path atomically by replacing it with a fully written temp file"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except Exception:
+        logger.error(f"Error saving {path}", exc_info=True)
+
+class DebouncedJsonStore:
+    def __init__(self, path, delay=0.5):
+        self.path = path
+        self.delay = delay  # Seconds to wait for more changes before writing
+        self._pending = None  # Data waiting to be written, or None if nothing is dirty
+        self._timer = None
+        self._last_write = None  # Future of the most recently queued write
+    
+    def schedule_save(self, data):
+        """
+        Mark data as needing to be written, coalescing bursts of changes into one write
+        
+        Parameters:
+        data (dict): The data to save; it is serialized when the write happens, so
+                     later changes to the same object are included
+        """
+        self._pending = data
+        if self._timer is not None:
+            return
+        
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            # No event loop to schedule on (e.g. a script), so write straight away
+            self.flush()
+            return
+        self._timer = loop.call_later(self.delay, self._write_pending)
+    
+    def _write_pending(self):
+        """Serialize the pending data and queue the file write on the writer thread"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending is None:
+            return
+        
+        # Serialize here rather than on the writer thread, since the data keeps changing
+        data, self._pending = self._pending, None
+        try:
+            text = json.dumps(data, separators=(",", ":"))
+        except Exception:
+            logger.error(f"Error saving {self.path}", exc_info=True)
+            return
+        self._last_write = _WRITER.submit(_write_file, self.path, text)
+    
+    def flush(self):
+        """Write any pending data now and wait until every queued write has finished"""
+        self._write_pending()
+        if self._last_write is not None:
+            self._last_write.result()
@@ -1,50 +1,166 @@
+import re
 import json
+import random
+import asyncio
+import logging
+import httpx
 from mistralai import Mistral
+from mistralai.models.sdkerror import SDKError
+
+logger = logging.getLogger(__name__)
 
 MISTRAL_MODEL = "mistral-large-latest"
 
-async def is_research_query(client, msgContent: str) -> bool:
-    prompt = """
-    Determine if the following message is requesting info about academic research or scholarly papers.
-    Return a JSON response with a single key "is_research" with value true or false.
+_json_decode = json.JSONDecoder().decode
+
+# Classification sits in front of every reply, so transient errors get a few quick retries
+# rather than the long backoff used for answers
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_MAX_ATTEMPTS = 3
+_MAX_RETRY_DELAY = 2.0
+
+# System prompts are fixed, so their messages are built once and reused for every request.
+# They are kept on single lines so indentation whitespace is not sent as input tokens.
+_CLASSIFY_PROMPT = (
+    "Determine if the following message is requesting info about academic research or scholarly papers, "
+    "and if it is, extract a search query for Google Scholar from it. "
+    "Return a JSON response with two keys: \"is_research\" with value true or false, and \"search_query\" "
+    "which contains the search terms to use, or an empty string if the message is not a research query. "
+    "Make the search query specific but concise (5-8 words maximum)."
+)
+_CLASSIFY_SYSTEM_MESSAGE = {"role": "system", "content": _CLASSIFY_PROMPT}
+
+_EXTRACT_QUERY_PROMPT = (
+    "Extract a search query for Google Scholar from the following message. "
+    "Return a JSON response with a single key \"search_query\" which contains the search terms to use. "
+    "Make the search query specific but concise (5-8 words maximum)."
+)
+_EXTRACT_QUERY_SYSTEM_MESSAGE = {"role": "system", "content": _EXTRACT_QUERY_PROMPT}
+
+# Heuristics that settle obvious cases without asking the LLM classifier. A research word on
+# its own ("thanks for the paper!", "I need to study") is not enough to skip the classifier;
+# only an explicit request for literature or a paper identifier is.
+_RESEARCH_HINT_RE = re.compile(r'\b(?:papers?|research|study|studies|articles?|citations?|publications?|authors?|journals?|preprints?|literature|arxiv|doi|scholarly)\b')
+_RESEARCH_REQUEST_RE = re.compile(r'\b(?:papers?|research|studies|articles?|publications?|preprints?|literature)\s+(?:on|about|into|regarding|related to)\b')
+# DOIs (10.1234/...) and new-style arXiv IDs (YYMM.NNNNN with a real month, optionally versioned),
+# so ordinary decimals like 5551.23456 are left to the classifier
+_IDENTIFIER_RE = re.compile(r'\b10\.\d{4,9}/\S+|\b\d{2}(?:0[1-9]|1[0-2])\.\d{4,5}(?:v\d+)?\b')
+# Only matches when the whole message is a greeting or acknowledgement
+_SMALL_TALK_RE = re.compile(r'^(?:(?:hi|hello|hey|thanks|thank you|thx|ok|okay|bye|good (?:morning|afternoon|evening|night))(?: (?:there|all|everyone|so much|a lot))?\W*)+$')
+
+def quick_triage(msgContent: str):
     """
-    try:
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": msgContent}
-        ]
-        response = await client.chat.complete_async(
-            model=MISTRAL_MODEL,
-            messages=messages,
-            response_format={"type": "json_object"}
-        )
-        result = response.choices[0].message.content
-        parsed = json.loads(result)
-        return parsed.get("is_research", False)
-    except Exception as e:
-        print(f"Error in is_research_query: {e}")
+    Classify obvious research queries and small talk locally
+    
+    Parameters:
+    msgContent (str): The message content
+    
+    Returns:
+    bool or None: True or False for obvious cases, None if the LLM should decide
+    """
+    content = " ".join(msgContent.lower().split())
+    if _RESEARCH_REQUEST_RE.search(content) or _IDENTIFIER_RE.search(content):
+        return True
+    if _SMALL_TALK_RE.match(content):
         return False
+    # Very short messages with no research vocabulary at all are chatter
+    if len(content) < 15 and not _RESEARCH_HINT_RE.search(content):
+        return False
+    return None
 
-
-async def extract_search_query(client, msgContent: str) -> str:
-    prompt = """
-    Extract a search query for Google Scholar from the following message.
-    Return a JSON response with a single key "search_query" which contains the search terms to use.
-    Make the search query specific but concise (5-8 words maximum).
+async def _complete_json(client, system_message, msgContent):
     """
+    Send a JSON-mode chat request and decode the reply
+    
+    Parameters:
+    client (Mistral): The Mistral client
+    system_message (dict): The prebuilt system message
+    msgContent (str): The message content
+    
+    Returns:
+    dict or None: The decoded JSON object, or None if the request or decoding failed
+                  (rate limits, 5xx errors, timeouts and connection errors are retried a
+                  couple of times first)
+    """
+    messages = [
+        system_message,
+        {"role": "user", "content": msgContent}
+    ]
+    for attempt in range(_MAX_ATTEMPTS):
+        try:
+            response = await client.chat.complete_async(
+                model=MISTRAL_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"}
+            )
+            break
+        except SDKError as e:
+            if e.status_code not in _RETRYABLE_STATUS_CODES or attempt == _MAX_ATTEMPTS - 1:
+                logger.warning(f"Mistral request failed with status {e.status_code}")
+                return None
+            reason = f"Mistral returned {e.status_code}"
+        except httpx.TransportError as e:
+            # Timeouts and connection errors (httpx.TimeoutException is a TransportError)
+            if attempt == _MAX_ATTEMPTS - 1:
+                logger.warning(f"Mistral request failed: {e!r}")
+                return None
+            reason = f"Mistral request failed ({type(e).__name__})"
+        except Exception:
+            logger.warning("Mistral request failed", exc_info=True)
+            return None
+        
+        # Exponential backoff with jitter so concurrent classifications don't retry in lockstep
+        delay = min(_MAX_RETRY_DELAY, 0.2 * 2 ** attempt) * (0.5 + random.random())
+        logger.warning(f"{reason}. Retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+    
     try:
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": msgContent}
-        ]
-        response = await client.chat.complete_async(
-            model=MISTRAL_MODEL,
-            messages=messages,
-            response_format={"type": "json_object"}
-        )
-        result = response.choices[0].message.content
-        parsed = json.loads(result)
-        return parsed.get("search_query", "")
-    except Exception as e:
-        print(f"Error in extract_search_query: {e}")
-        return "" 
\ No newline at end of file
+        parsed = _json_decode(response.choices[0].message.content)
+    except (json.JSONDecodeError, AttributeError, IndexError, TypeError) as e:
+        logger.warning(f"Could not decode Mistral JSON reply: {e}")
+        return None
+    
+    if not isinstance(parsed, dict):
+        logger.warning(f"Mistral JSON reply is not an object: {parsed!r}")
+        return None
+    return parsed
+
+
+async def classify_and_extract(client, msgContent: str) -> tuple | None:
+    """
+    Classify a message and extract its search query with a single Mistral request
+    
+    Parameters:
+    client (Mistral): The Mistral client
+    msgContent (str): The message content
+    
+    Returns:
+    tuple or None: (is_research, search_query), where search_query is "" if not a research
+                   query; None if the request failed, so callers can tell it apart from a "no"
+    """
+    parsed = await _complete_json(client, _CLASSIFY_SYSTEM_MESSAGE, msgContent)
+    if parsed is None:
+        return None
+    
+    is_research = bool(parsed.get("is_research", False))
+    return (is_research, parsed.get("search_query", "") if is_research else "")
+
+
+async def is_research_query(client, msgContent: str) -> bool:
+    triage = quick_triage(msgContent)
+    if triage is not None:
+        return triage
+    
+    classification = await classify_and_extract(client, msgContent)
+    if classification is None:
+        return False
+    return classification[0]
+
+
+async def extract_search_query(client, msgContent: str) -> str | None:
+    # None rather than "" on failure, so callers don't mistake an outage for an empty query
+    parsed = await _complete_json(client, _EXTRACT_QUERY_SYSTEM_MESSAGE, msgContent)
+    if parsed is None:
+        return None
+    
+    return parsed.get("search_query", "")
@@ -3,37 +3,44 @@ Functionality for managing reading lists/collections of papers.
 """
 import json
 import os
+from json_store import DebouncedJsonStore
 
 class ReadingLists:
     def __init__(self, lists_file="reading_lists.json"):
         self.lists_file = lists_file
+        self._store = DebouncedJsonStore(lists_file)
         self.reading_lists = self._load_lists()
+        # Set of paper keys per list, kept alongside the ordered lists for O(1) membership checks
+        self._members = {cid: {name: set(paper_keys) for name, paper_keys in lists.items()}
+                         for cid, lists in self.reading_lists.items()}
     
     def _load_lists(self):
         """Load reading lists from file if it exists, otherwise return empty dict"""
         if os.path.exists(self.lists_file):
             try:
                 with open(self.lists_file, 'r') as f:
-                    return json.load(f)
+                    # JSON object keys are always strings; channel IDs are used as int keys
+                    return {int(cid) if cid.isdigit() else cid: lists
+                            for cid, lists in json.load(f).items()}
             except Exception as e:
                 print(f"Error loading reading lists: {e}")
                 return {}
         return {}
     
     def _save_lists(self):
-        """Save reading lists to file"""
-        try:
-            with open(self.lists_file, 'w') as f:
-                json.dump(self.reading_lists, f, indent=2)
-        except Exception as e:
-            print(f"Error saving reading lists: {e}")
+        """Schedule the reading lists to be written to file; bursts of changes share one write"""
+        self._store.schedule_save(self.reading_lists)
+    
+    def flush(self):
+        """Write any reading list changes that are still waiting to be saved"""
+        self._store.flush()
     
     def create_list(self, conversation_id, list_name):
         """
         Create a new reading list
         
         Parameters:
-        conversation_id (str): ID of the conversation (e.g., channel ID)
+        conversation_id (int): ID of the conversation (e.g., channel ID)
         list_name (str): Name of the reading list
         
         Returns:
@@ -42,6 +49,7 @@ class ReadingLists:
         # Initialize conversation dict if it doesn't exist
         if conversation_id not in self.reading_lists:
             self.reading_lists[conversation_id] = {}
+            self._members[conversation_id] = {}
         
         # Check if list already exists
         if list_name in self.reading_lists[conversation_id]:
@@ -49,6 +57,7 @@ class ReadingLists:
         
         # Create the list
         self.reading_lists[conversation_id][list_name] = []
+        self._members[conversation_id][list_name] = set()
         
         self._save_lists()
         return True
@@ -58,7 +67,7 @@ class ReadingLists:
         Add a paper to a reading list
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         list_name (str): Name of the reading list
         paper_key (str): Key identifying the paper
         
@@ -72,11 +81,13 @@ class ReadingLists:
                 return False
             
             # Check if paper is already in the list
-            if paper_key in self.reading_lists[conversation_id][list_name]:
+            members = self._members[conversation_id][list_name]
+            if paper_key in members:
                 return True  # Already in list, still consider successful
             
             # Add the paper to the list
             self.reading_lists[conversation_id][list_name].append(paper_key)
+            members.add(paper_key)
             
             self._save_lists()
             return True
@@ -88,7 +99,7 @@ class ReadingLists:
         Remove a paper from a reading list
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         list_name (str): Name of the reading list
         paper_key (str): Key identifying the paper
         
@@ -102,11 +113,13 @@ class ReadingLists:
                 return False
             
             # Check if paper is in the list
-            if paper_key not in self.reading_lists[conversation_id][list_name]:
+            members = self._members[conversation_id][list_name]
+            if paper_key not in members:
                 return False
             
             # Remove the paper from the list
             self.reading_lists[conversation_id][list_name].remove(paper_key)
+            members.discard(paper_key)
             
             self._save_lists()
             return True
@@ -118,7 +131,7 @@ class ReadingLists:
         Delete a reading list
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         list_name (str): Name of the reading list
         
         Returns:
@@ -132,6 +145,7 @@ class ReadingLists:
             
             # Delete the list
             del self.reading_lists[conversation_id][list_name]
+            del self._members[conversation_id][list_name]
             
             self._save_lists()
             return True
@@ -143,7 +157,7 @@ class ReadingLists:
         Get all reading lists for a conversation
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         
         Returns:
         dict: Reading lists for the conversation
@@ -158,7 +172,7 @@ class ReadingLists:
         Get a specific reading list
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         list_name (str): Name of the reading list
         
         Returns:
@@ -169,14 +183,14 @@ class ReadingLists:
         
         return self.reading_lists[conversation_id].get(list_name, None)
     
-    def format_lists(self, conversation_id, list_name=None, paper_info=None):
+    def format_lists(self, conversation_id, list_name=None, paper_titles=None):
         """
         Format reading lists for display
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         list_name (str, optional): Name of a specific list to format. If None, format all lists
-        paper_info (dict, optional): Dictionary mapping paper_keys to paper info
+        paper_titles (dict, optional): Dictionary mapping paper_keys to "Title (year)" strings
         
         Returns:
         str: Formatted reading lists
@@ -191,17 +205,14 @@ class ReadingLists:
             if not paper_keys:
                 return f"Reading list '{list_name}' is empty."
             
-            result = f"Reading List: {list_name}\n\n"
+            parts = [f"Reading List: {list_name}\n\n"]
             
             # Format the papers in the list
             for i, paper_key in enumerate(paper_keys, 1):
-                paper_title = "Unknown Paper"
-                if paper_info and paper_key in paper_info:
-                    paper_title = f"{paper_info[paper_key]['title']} ({paper_info[paper_key]['year']})"
-                
-                result += f"{i}. {paper_title}\n"
+                paper_title = paper_titles.get(paper_key, "Unknown Paper") if paper_titles else "Unknown Paper"
+                parts.append(f"{i}. {paper_title}\n")
             
-            return result
+            return "".join(parts)
         
         # Format all lists
         lists = self.get_lists(conversation_id)
@@ -209,11 +220,11 @@ class ReadingLists:
         if not lists:
             return "No reading lists found."
         
-        result = "Reading Lists:\n\n"
+        parts = ["Reading Lists:\n\n"]
         
         for list_name, paper_keys in lists.items():
-            result += f"📚 {list_name} ({len(paper_keys)} papers)\n"
+            parts.append(f"📚 {list_name} ({len(paper_keys)} papers)\n")
         
-        result += "\nUse '!reading_list view <list_name>' to see papers in a specific list."
+        parts.append("\nUse '!reading_list view <list_name>' to see papers in a specific list.")
         
-        return result
+        return "".join(parts)
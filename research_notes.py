@@ -3,11 +3,13 @@ Functionality for managing research notes associated with papers.
 """
 import json
 import os
+from json_store import DebouncedJsonStore
 from datetime import datetime
 
 class ResearchNotes:
     def __init__(self, notes_file="research_notes.json"):
         self.notes_file = notes_file
+        self._store = DebouncedJsonStore(notes_file)
         self.notes = self._load_notes()
     
     def _load_notes(self):
@@ -15,26 +17,28 @@ class ResearchNotes:
         if os.path.exists(self.notes_file):
             try:
                 with open(self.notes_file, 'r') as f:
-                    return json.load(f)
+                    # JSON object keys are always strings; channel IDs are used as int keys
+                    return {int(cid) if cid.isdigit() else cid: papers
+                            for cid, papers in json.load(f).items()}
             except Exception as e:
                 print(f"Error loading notes: {e}")
                 return {}
         return {}
     
     def _save_notes(self):
-        """Save notes to file"""
-        try:
-            with open(self.notes_file, 'w') as f:
-                json.dump(self.notes, f, indent=2)
-        except Exception as e:
-            print(f"Error saving notes: {e}")
+        """Schedule the notes to be written to file; bursts of changes share one write"""
+        self._store.schedule_save(self.notes)
+    
+    def flush(self):
+        """Write any note changes that are still waiting to be saved"""
+        self._store.flush()
     
     def add_note(self, conversation_id, paper_key, note_text):
         """
         Add a note to a paper
         
         Parameters:
-        conversation_id (str): ID of the conversation (e.g., channel ID)
+        conversation_id (int): ID of the conversation (e.g., channel ID)
         paper_key (str): Key identifying the paper
         note_text (str): The note to add
         
@@ -65,7 +69,7 @@ class ResearchNotes:
         Get notes for a paper or all papers in a conversation
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         paper_key (str, optional): Key identifying the paper. If None, return all notes
         
         Returns:
@@ -84,7 +88,7 @@ class ResearchNotes:
         Delete a specific note
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         paper_key (str): Key identifying the paper
         note_index (int): Index of the note to delete (0-based)
         
@@ -103,14 +107,14 @@ class ResearchNotes:
         except Exception:
             return False
     
-    def format_notes(self, conversation_id, paper_key=None, paper_info=None):
+    def format_notes(self, conversation_id, paper_key=None, paper_titles=None):
         """
         Format notes for display
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         paper_key (str, optional): Key identifying the paper. If None, format all notes
-        paper_info (dict, optional): Dictionary mapping paper_keys to paper info
+        paper_titles (dict, optional): Dictionary mapping paper_keys to "Title (year)" strings
         
         Returns:
         str: Formatted notes
@@ -120,32 +124,29 @@ class ResearchNotes:
         if not notes_dict:
             return "No notes found."
         
-        result = "Research Notes:\n\n"
+        parts = ["Research Notes:\n\n"]
         
         for pk, notes in notes_dict.items():
-            # Get paper title if paper_info is provided
-            paper_title = "Unknown Paper"
-            if paper_info and pk in paper_info:
-                paper_title = f"{paper_info[pk]['title']} ({paper_info[pk]['year']})"
+            # Get paper title if paper_titles is provided
+            paper_title = paper_titles.get(pk, "Unknown Paper") if paper_titles else "Unknown Paper"
             
-            result += f"Paper: {paper_title}\n"
+            parts.append(f"Paper: {paper_title}\n")
             
             if not notes:
-                result += "  No notes for this paper.\n\n"
+                parts.append("  No notes for this paper.\n\n")
                 continue
             
-            for i, note in enumerate(notes):
-                result += f"  Note {i+1} [{note['timestamp']}]:\n"
-                result += f"  {note['text']}\n\n"
+            for i, note in enumerate(notes, 1):
+                parts.append(f"  Note {i} [{note['timestamp']}]:\n  {note['text']}\n\n")
         
-        return result
+        return "".join(parts)
     
     def clear_notes(self, conversation_id, paper_key=None):
         """
         Clear all notes for a paper or conversation
         
         Parameters:
-        conversation_id (str): ID of the conversation
+        conversation_id (int): ID of the conversation
         paper_key (str, optional): Key identifying the paper. If None, clear all notes
         
         Returns:
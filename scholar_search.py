@@ -1,6 +1,18 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from scholarly import scholarly
+from caching import LRUCache
 
-async def search_google_scholar(query: str, maxResults: int = 3):
+# scholarly does blocking network I/O, so searches run on a small dedicated pool to keep
+# the Discord event loop responsive; the bound also limits concurrent Scholar requests
+_SCHOLAR_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="scholarly")
+
+# Scholar results for the same query are stable for a while, so repeats skip the network
+_SEARCH_CACHE = LRUCache(maxsize=1024, ttl=3600)
+# Searches still running, keyed like _SEARCH_CACHE, so concurrent identical queries share one
+_INFLIGHT = {}
+
+def search_google_scholar_sync(query: str, maxResults: int = 3):
     try:
         search_query = scholarly.search_pubs(query)
         results = []
@@ -23,17 +35,37 @@ async def search_google_scholar(query: str, maxResults: int = 3):
     except Exception:
         return []
 
+async def search_google_scholar(query: str, maxResults: int = 3):
+    cache_key = (" ".join(query.lower().split()), maxResults)
+    results = _SEARCH_CACHE.get(cache_key)
+    if results is not None:
+        return list(results)
+    
+    # Join an identical search that is already running instead of sending another request
+    search = _INFLIGHT.get(cache_key)
+    if search is None:
+        loop = asyncio.get_running_loop()
+        search = loop.run_in_executor(_SCHOLAR_POOL, search_google_scholar_sync, query, maxResults)
+        _INFLIGHT[cache_key] = search
+        search.add_done_callback(lambda _: _INFLIGHT.pop(cache_key, None))
+    
+    # Shielded so a cancelled caller doesn't cancel the search other callers are waiting on
+    results = await asyncio.shield(search)
+    # An empty list may just mean Scholar failed or blocked us, so only real results are kept
+    if results:
+        _SEARCH_CACHE.put(cache_key, results)
+    return list(results)
+
 async def format_search_results(searchQ: str, results: list) -> str:
     if not results:
         return f"0 results found for '{searchQ}'."
     
-    formatted_results = ""
-    for i, paper in enumerate(results, 1):
-        formatted_results += f"Paper {i}:\n"
-        formatted_results += f"Title: {paper['title']}\n"
-        formatted_results += f"Authors: {paper['authors']}\n"
-        formatted_results += f"Year: {paper['year']}\n"
-        formatted_results += f"Citations: {paper['citations']}\n"
-        formatted_results += f"URL: {paper['url']}\n\n"
-    
-    return formatted_results 
\ No newline at end of file
+    return "".join(
+        f"Paper {i}:\n"
+        f"Title: {paper['title']}\n"
+        f"Authors: {paper['authors']}\n"
+        f"Year: {paper['year']}\n"
+        f"Citations: {paper['citations']}\n"
+        f"URL: {paper['url']}\n\n"
+        for i, paper in enumerate(results, 1)
+    ) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+import unittest
+
+from query_processing import quick_triage
+
+
+class QuickTriageIdentifierTest(unittest.TestCase):
+    def test_paper_identifiers_are_research(self):
+        for message in (
+            "can you summarize 2301.01234v2 for me",
+            "what about 1912.12345",
+            "look up 10.1038/nature14539 please",
+        ):
+            with self.subTest(message=message):
+                self.assertIs(quick_triage(message), True)
+
+    def test_ordinary_numbers_are_not_identifiers(self):
+        for message in (
+            "my phone is 5551.23456",
+            "Version 1.2 released in 2023.1234",
+            "the total came to 1300.5000 dollars",
+        ):
+            with self.subTest(message=message):
+                self.assertIsNot(quick_triage(message), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
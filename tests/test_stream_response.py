@@ -0,0 +1,55 @@
+import asyncio
+import random
+import unittest
+from types import SimpleNamespace
+
+from agent import MistralAgent
+
+
+class _FakeStream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            yield SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))]))
+
+
+def _make_agent(deltas):
+    # Skip __init__, which opens the note and reading list files
+    agent = MistralAgent.__new__(MistralAgent)
+    agent._llm_slots = asyncio.Semaphore(1)
+
+    async def stream_async(model, messages):
+        return _FakeStream(deltas)
+
+    agent.client = SimpleNamespace(chat=SimpleNamespace(stream_async=stream_async))
+    return agent
+
+
+async def _collect(deltas):
+    return [chunk async for chunk in _make_agent(deltas).stream_response([])]
+
+
+class StreamResponseTest(unittest.TestCase):
+    def assertStreamsLikeSplit(self, deltas):
+        text = "".join(deltas)
+        streamed = asyncio.run(_collect(deltas))
+        expected = MistralAgent.split_message(None, text) if text else []
+        self.assertEqual(streamed, expected)
+
+    def test_whitespace_delta_across_chunk_boundary(self):
+        self.assertStreamsLikeSplit(["a" * 1999, "\n ", "b" * 10])
+
+    def test_random_delta_splits(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            length = rng.choice([50, 1990, 2500, 4100, 7000])
+            text = "".join(rng.choice("ab \n\t") if rng.random() < 0.3 else "x" for _ in range(length))
+            cuts = sorted(rng.sample(range(1, length), rng.randint(0, min(60, length - 1))))
+            deltas = [text[i:j] for i, j in zip([0] + cuts, cuts + [length])]
+            self.assertStreamsLikeSplit(deltas)
+
+
+if __name__ == "__main__":
+    unittest.main()